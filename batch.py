@@ -0,0 +1,91 @@
+import sys
+
+import import_profiler
+# Started before anything else is imported, with --profile-imports or CURSEFORGE_PROFILE_IMPORTS
+import_profiler.start()
+
+import configurator
+import curseforge_cache
+import curseforge_http
+import curseforge_metrics
+import logger
+from configurator import Settings, Profile
+from curseforge_downloader import CurseForgeDownloader
+from curseforge_resolver import SharedResolver
+
+# The properties file that is read when no path is given on the command line
+PROPERTIES_FILE = 'properties.ini'
+
+
+def run_profile(settings: Settings, profile: Profile, resolver: SharedResolver):
+    logger.log_info('Running profile "%s": %s -> %s' % (profile.name, profile.mods_file, profile.output_folder))
+    downloader = CurseForgeDownloader(profile.mods_file, profile.output_folder, profile.versions,
+                                      profile.excluded_versions, profile.release_types,
+                                      workers=settings.workers,
+                                      bulk_size=settings.bulk_size,
+                                      server_side_filter=settings.server_side_filter,
+                                      listing_ttl=settings.listing_ttl,
+                                      offline=profile.offline,
+                                      fingerprints=settings.fingerprints,
+                                      buffer_size=settings.buffer_size,
+                                      max_retries=settings.max_retries,
+                                      max_downloads=settings.max_downloads,
+                                      bandwidth_limit=settings.bandwidth_limit,
+                                      store_path=settings.store_folder,
+                                      resolver=resolver,
+                                      request_missing_ids=profile.request_missing_ids,
+                                      max_searches=settings.max_searches,
+                                      search_size=settings.search_size,
+                                      unresolved_ttl=settings.unresolved_ttl)
+    if profile.execution_type == 'CHECK':
+        downloader.check_for_updates(profile.plan_file)
+    elif profile.execution_type == 'UPDATE':
+        downloader.update_all()
+    else:
+        downloader.download_all()
+
+
+if __name__ == '__main__':
+    config = configurator.read_config(sys.argv[1] if len(sys.argv) > 1 else PROPERTIES_FILE)
+    if config is None:
+        sys.exit(1)
+    settings, profiles = config
+
+    log_sinks = [logger.ConsoleSink()]
+    if settings.log_file is not None:
+        log_sinks.append(logger.RotatingFileSink(settings.log_file))
+    if settings.log_json_file is not None:
+        log_sinks.append(logger.JsonLinesSink(settings.log_json_file))
+    logger.configure(settings.log_level, log_sinks)
+    curseforge_cache.connect()
+    if settings.snapshot_file is not None:
+        curseforge_cache.load_snapshot(settings.snapshot_file)
+    curseforge_http.connect(curseforge_http.get_pool_size(settings.workers, settings.max_downloads),
+                            settings.connect_timeout, settings.read_timeout, settings.requests_per_second)
+    # Every profile runs in this process with the same resolver, so a mod that is in several mods lists
+    # is resolved once and each page of its files is queried once
+    resolver = SharedResolver()
+    failed_profiles = []
+    for profile in profiles:
+        # A profile that fails is reported and the batch goes on with the next one
+        try:
+            run_profile(settings, profile, resolver)
+        except Exception as e:
+            logger.log_severe('Profile "%s" failed: %s' % (profile.name, e))
+            failed_profiles.append(profile.name)
+        # The summary of the next profile only lists its own warnings and errors
+        logger.reset_errors()
+    # A single report covers every profile of the batch
+    if settings.report_file is not None:
+        curseforge_metrics.save_report(settings.report_file)
+    if settings.prometheus_file is not None:
+        curseforge_metrics.save_prometheus(settings.prometheus_file)
+    if settings.snapshot_file is not None:
+        curseforge_cache.save_snapshot(settings.snapshot_file)
+    curseforge_http.close()
+    curseforge_cache.close()
+    logger.close()
+    import_profiler.print_report()
+    if len(failed_profiles) != 0:
+        print('Failed profiles: %s' % ', '.join(failed_profiles))
+        sys.exit(1)
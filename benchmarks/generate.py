@@ -0,0 +1,66 @@
+import argparse
+import os
+import shutil
+from typing import Dict
+
+import curseforge_fingerprint
+from benchmarks.mock_api import MockCurseForge
+
+# Shares of the mods that are already in a generated output folder, as their latest file or as an older one
+DEFAULT_CURRENT = 0.5
+DEFAULT_OUTDATED = 0.25
+
+
+def write_mods_list(mock: MockCurseForge, file_path: str):
+    # The libraries are left out, so the downloader has to find and add them as dependencies
+    with open(file_path, 'w') as file:
+        file.write('\n'.join(mock.get_mod_url(mod_id) for mod_id in mock.get_mod_ids()) + '\n')
+
+
+def write_output_folder(mock: MockCurseForge, folder_path: str, current: float = DEFAULT_CURRENT,
+                        outdated: float = DEFAULT_OUTDATED) -> Dict[str, int]:
+    # The first mods of the list are current, the next ones outdated and the rest are missing
+    shutil.rmtree(folder_path, ignore_errors=True)
+    os.makedirs(folder_path)
+    mod_ids = mock.get_mod_ids()
+    current_count = int(len(mod_ids) * current)
+    outdated_count = min(len(mod_ids) - current_count, int(len(mod_ids) * outdated))
+    written = {'current': 0, 'outdated': 0, 'missing': len(mod_ids) - current_count - outdated_count}
+    file_ids = {}  # path, file id
+    for position, mod_id in enumerate(mod_ids[:current_count + outdated_count]):
+        state = 'current' if position < current_count else 'outdated'
+        file_id = mock.get_latest_file_id(mod_id, 0 if state == 'current' else 1)
+        if file_id is None:
+            continue
+        file_path = os.path.join(folder_path, mock.get_file_name(file_id))
+        with open(file_path, 'wb') as file:
+            file.write(mock.get_jar(file_id))
+        file_ids[file_path] = file_id
+        written[state] += 1
+
+    # The mock answers fingerprint lookups of every jar that is put into an output folder
+    for file_path, fingerprint in curseforge_fingerprint.fingerprint_files(list(file_ids)).items():
+        mock.add_fingerprint(file_ids[file_path], fingerprint)
+    return written
+
+
+def __parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Generates a mods list and an output folder for the mock API')
+    parser.add_argument('mods_file')
+    parser.add_argument('--output-folder', help='also fill this folder with current and outdated jars')
+    parser.add_argument('--mods', type=int, default=500)
+    parser.add_argument('--files-per-mod', type=int, default=120)
+    parser.add_argument('--jar-size', type=int, default=64 * 1024)
+    parser.add_argument('--current', type=float, default=DEFAULT_CURRENT)
+    parser.add_argument('--outdated', type=float, default=DEFAULT_OUTDATED)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = __parse_args()
+    generator = MockCurseForge(args.mods, args.files_per_mod, args.jar_size)
+    write_mods_list(generator, args.mods_file)
+    print('Wrote %s mods to %s' % (args.mods, args.mods_file))
+    if args.output_folder is not None:
+        print('Wrote %s to %s' % (write_output_folder(generator, args.output_folder, args.current, args.outdated),
+                                  args.output_folder))
@@ -0,0 +1,387 @@
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+import curseforge_fingerprint
+
+GAME_ID = 432
+GAME_SLUG = 'minecraft'
+CATEGORY_ID = 6
+CATEGORY_SLUG = 'mc-mods'
+
+# Mods of the list and the libraries they depend on, every LIBRARY_EVERY-th mod requires a library
+MOD_ID_BASE = 100000
+LIBRARY_ID_BASE = 900000
+LIBRARY_EVERY = 10
+LIBRARY_FILES = 10
+# File IDs are the mod ID followed by three digits, so a mod has at most this many files
+MAX_FILES = 1000
+
+# The API never returns more than this many files per page, nor any file past this index
+MAX_PAGE_SIZE = 50
+MAX_INDEX = 10000
+
+# Jar sizes are spread over these multiples of the configured size, most mods are small and a few are large
+SIZE_FACTORS = (0.25, 0.5, 0.5, 1.0, 1.0, 1.0, 2.0, 4.0)
+# Every jar ends with its zero-padded file ID, so jars of the same size share all bytes before it
+ID_SUFFIX_SIZE = 16
+
+FILE_EPOCH = datetime(2021, 1, 1, 10, 0, 0)
+DATE_MODIFIED = '2021-06-01T00:00:00Z'
+# Game versions by file index, the newest files are a mix of every version and loader
+FILE_VERSIONS = (['1.16.5', 'Forge'], ['1.16.5', 'Forge'], ['1.16.5', 'Fabric'], ['1.12.2', 'Forge'])
+LOADER_NAMES = {1: 'Forge', 4: 'Fabric'}
+RELEASE = 1
+BETA = 2
+
+
+class MockCurseForge:
+    mods: int
+    files_per_mod: int
+    jar_size: int
+    latency: float  # seconds before every response
+    throttle_rate: float  # share of API requests that are answered with 429
+    counts: Dict[str, int]  # endpoint, requests
+
+    def __init__(self, mods: int = 50, files_per_mod: int = 120, jar_size: int = 64 * 1024, latency: float = 0.0,
+                 throttle_rate: float = 0.0, seed: int = 0):
+        self.mods = mods
+        self.files_per_mod = max(1, min(MAX_FILES, files_per_mod))
+        self.jar_size = max(ID_SUFFIX_SIZE * 2, jar_size)
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.base_url = ''
+        self.counts = dict()
+        self.fingerprints = dict()  # fingerprint, file id
+        self.file_fingerprints = dict()  # file id, fingerprint
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+
+        # Jars are incompressible like real ones. Hashes of the shared prefix are computed once per size.
+        sizes = sorted(set(self.__get_size_of_factor(factor) for factor in SIZE_FACTORS))
+        self.body = b''.join(hashlib.sha256(b'%d' % index).digest() for index in range(sizes[-1] // 32 + 1))
+        self.prefix_hashers = {size: (hashlib.sha1(self.body[:size - ID_SUFFIX_SIZE]),
+                                      hashlib.md5(self.body[:size - ID_SUFFIX_SIZE])) for size in sizes}
+
+    #########################################################
+    # DATA FUNCTIONS
+    #########################################################
+
+    def __get_size_of_factor(self, factor: float) -> int:
+        return max(ID_SUFFIX_SIZE * 2, int(self.jar_size * factor))
+
+    def get_library_count(self) -> int:
+        return max(1, self.mods // LIBRARY_EVERY)
+
+    def get_mod_ids(self) -> List[int]:
+        return [MOD_ID_BASE + number for number in range(1, self.mods + 1)]
+
+    def is_mod(self, mod_id: int) -> bool:
+        return MOD_ID_BASE < mod_id <= MOD_ID_BASE + self.mods or \
+            LIBRARY_ID_BASE < mod_id <= LIBRARY_ID_BASE + self.get_library_count()
+
+    def get_slug(self, mod_id: int) -> str:
+        if mod_id > LIBRARY_ID_BASE:
+            return 'bench-lib-%s' % (mod_id - LIBRARY_ID_BASE)
+        return 'bench-mod-%s' % (mod_id - MOD_ID_BASE)
+
+    def get_mod_url(self, mod_id: int) -> str:
+        return 'https://www.curseforge.com/%s/%s/%s' % (GAME_SLUG, CATEGORY_SLUG, self.get_slug(mod_id))
+
+    def get_mod_id(self, slug: str) -> Optional[int]:
+        for prefix, base in (('bench-mod-', MOD_ID_BASE), ('bench-lib-', LIBRARY_ID_BASE)):
+            if slug.startswith(prefix) and slug[len(prefix):].isdigit():
+                mod_id = base + int(slug[len(prefix):])
+                return mod_id if self.is_mod(mod_id) else None
+        return None
+
+    def get_mod_json(self, mod_id: int) -> Dict[str, Any]:
+        return {
+            'id': mod_id,
+            'gameId': GAME_ID,
+            'classId': CATEGORY_ID,
+            'slug': self.get_slug(mod_id),
+            'name': self.get_slug(mod_id).replace('-', ' ').title(),
+            'dateModified': DATE_MODIFIED,
+            'latestFiles': [],
+        }
+
+    def get_file_count(self, mod_id: int) -> int:
+        return LIBRARY_FILES if mod_id > LIBRARY_ID_BASE else self.files_per_mod
+
+    def get_file_ids(self, mod_id: int) -> List[int]:
+        # Newest first, the order in which the API returns them
+        return [mod_id * MAX_FILES + index for index in range(self.get_file_count(mod_id) - 1, -1, -1)]
+
+    def __get_dependencies(self, mod_id: int, file_index: int) -> List[Dict[str, int]]:
+        number = mod_id - MOD_ID_BASE
+        if mod_id > LIBRARY_ID_BASE or number % LIBRARY_EVERY != 0 or file_index < self.files_per_mod // 2:
+            return []
+        library_id = LIBRARY_ID_BASE + (number // LIBRARY_EVERY - 1) % self.get_library_count() + 1
+        return [{'modId': library_id, 'relationType': 3}]
+
+    def get_versions(self, file_id: int) -> List[str]:
+        return FILE_VERSIONS[file_id % MAX_FILES % len(FILE_VERSIONS)]
+
+    def get_jar_size(self, file_id: int) -> int:
+        return self.__get_size_of_factor(SIZE_FACTORS[(file_id * 2654435761 >> 8) % len(SIZE_FACTORS)])
+
+    def get_jar(self, file_id: int) -> bytes:
+        size = self.get_jar_size(file_id)
+        return self.body[:size - ID_SUFFIX_SIZE] + b'%016d' % file_id
+
+    def get_file_name(self, file_id: int) -> str:
+        return '%s-%s.jar' % (self.get_slug(file_id // MAX_FILES), file_id % MAX_FILES)
+
+    def get_file_json(self, file_id: int) -> Dict[str, Any]:
+        mod_id, index = divmod(file_id, MAX_FILES)
+        size = self.get_jar_size(file_id)
+        sha1, md5 = (hasher.copy() for hasher in self.prefix_hashers[size])
+        sha1.update(b'%016d' % file_id)
+        md5.update(b'%016d' % file_id)
+        return {
+            'id': file_id,
+            'gameId': GAME_ID,
+            'modId': mod_id,
+            'displayName': self.get_file_name(file_id),
+            'fileName': self.get_file_name(file_id),
+            'releaseType': BETA if index % 5 == 4 else RELEASE,
+            'fileStatus': 4,
+            'hashes': [{'value': sha1.hexdigest(), 'algo': 1}, {'value': md5.hexdigest(), 'algo': 2}],
+            'fileDate': (FILE_EPOCH + timedelta(hours=index)).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'fileLength': size,
+            'downloadCount': 1000 + index,
+            'downloadUrl': '%s/files/%s/%s' % (self.base_url, file_id, self.get_file_name(file_id)),
+            'gameVersions': list(self.get_versions(file_id)),
+            'sortableGameVersions': [],
+            'dependencies': self.__get_dependencies(mod_id, index),
+            'fileFingerprint': self.file_fingerprints.get(file_id, 0),
+            'modules': [{'name': 'META-INF', 'fingerprint': file_id}, {'name': 'assets', 'fingerprint': index}],
+        }
+
+    def get_latest_file_id(self, mod_id: int, skip: int = 0) -> Optional[int]:
+        # The newest Forge 1.16.5 release, or an older one, like the downloader picks with the benchmark filters
+        for file_id in self.get_file_ids(mod_id):
+            index = file_id % MAX_FILES
+            if index % 5 == 4 or self.get_versions(file_id) != ['1.16.5', 'Forge']:
+                continue
+            if skip == 0:
+                return file_id
+            skip -= 1
+        return None
+
+    def add_fingerprint(self, file_id: int, fingerprint: int):
+        # Fingerprints are only known for the jars that are put into output folders, hashing every jar is slow
+        with self.lock:
+            self.fingerprints[fingerprint] = file_id
+            self.file_fingerprints[file_id] = fingerprint
+
+    def index_fingerprints(self):
+        # A mock that did not generate the output folder itself knows the jars that the generator writes
+        if len(self.fingerprints) != 0:
+            return
+        for mod_id in self.get_mod_ids():
+            for skip in (0, 1):
+                file_id = self.get_latest_file_id(mod_id, skip)
+                if file_id is not None:
+                    self.add_fingerprint(file_id, curseforge_fingerprint.fingerprint_bytes(self.get_jar(file_id)))
+
+    #########################################################
+    # SERVER FUNCTIONS
+    #########################################################
+
+    def count(self, endpoint: str):
+        with self.lock:
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def reset_counts(self):
+        with self.lock:
+            self.counts.clear()
+
+    def get_counts(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.counts)
+
+    def should_throttle(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.throttle_rate
+
+    def start(self, port: int = 0) -> str:
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), MockRequestHandler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.base_url = 'http://127.0.0.1:%s' % self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name='mock-api', daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args):
+        pass
+
+    #########################################################
+    # RESPONSE FUNCTIONS
+    #########################################################
+
+    def __send_json(self, body: Any, status: int = 200):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            content = gzip.compress(content, compresslevel=1)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def __send_status(self, status: int, headers: Dict[str, str] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def __send_jar(self, file_id: int):
+        mock: MockCurseForge = self.server.mock
+        content = mock.get_jar(file_id)
+        start = 0
+        byte_range = self.headers.get('Range')
+        if byte_range is not None and byte_range.startswith('bytes='):
+            start = min(len(content), int(byte_range[len('bytes='):].split('-')[0] or 0))
+        self.send_response(206 if byte_range is not None else 200)
+        self.send_header('Content-Type', 'application/java-archive')
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def __begin(self, endpoint: str, api: bool) -> bool:
+        mock: MockCurseForge = self.server.mock
+        mock.count(endpoint)
+        if mock.latency > 0:
+            time.sleep(mock.latency)
+        if api and mock.should_throttle():
+            mock.count('429')
+            self.__send_status(429, {'Retry-After': '1'})
+            return False
+        return True
+
+    #########################################################
+    # ENDPOINT FUNCTIONS
+    #########################################################
+
+    def __get_files(self, mod_id: int, query: Dict[str, str]):
+        mock: MockCurseForge = self.server.mock
+        index = int(query.get('index', 0))
+        page_size = min(MAX_PAGE_SIZE, int(query.get('pageSize', MAX_PAGE_SIZE)))
+        if index + page_size > MAX_INDEX:
+            return self.__send_json({'error': 'index + pageSize must not exceed %s' % MAX_INDEX}, 400)
+        game_version = query.get('gameVersion')
+        loader = LOADER_NAMES.get(int(query['modLoaderType'])) if 'modLoaderType' in query else None
+        file_ids = [file_id for file_id in mock.get_file_ids(mod_id)
+                    if (game_version is None or game_version in mock.get_versions(file_id)) and
+                    (loader is None or loader in mock.get_versions(file_id))]
+        page = [mock.get_file_json(file_id) for file_id in file_ids[index:index + page_size]]
+        self.__send_json({'data': page, 'pagination': {'index': index, 'pageSize': page_size,
+                                                       'resultCount': len(page), 'totalCount': len(file_ids)}})
+
+    def do_GET(self):
+        mock: MockCurseForge = self.server.mock
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+
+        if parts[0] == 'files' and len(parts) == 3 and parts[1].isdigit():
+            if self.__begin('download', False):
+                self.__send_jar(int(parts[1]))
+            return
+        if parts[0] != 'v1' or len(parts) < 2:
+            return self.__send_status(404)
+        endpoint = '/'.join('{id}' if part.isdigit() else part for part in parts[1:])
+        if not self.__begin(endpoint, True):
+            return
+
+        if endpoint == 'games':
+            return self.__send_json({'data': [{'id': GAME_ID, 'slug': GAME_SLUG, 'name': 'Minecraft'}],
+                                     'pagination': {'index': 0, 'pageSize': 50, 'resultCount': 1, 'totalCount': 1}})
+        if endpoint == 'categories':
+            return self.__send_json({'data': [{'id': CATEGORY_ID, 'gameId': GAME_ID, 'slug': CATEGORY_SLUG,
+                                               'name': 'Mods', 'isClass': True}]})
+        if endpoint == 'mods/search':
+            mod_id = mock.get_mod_id(query.get('slug', ''))
+            mods = [mock.get_mod_json(mod_id)] if mod_id is not None else []
+            return self.__send_json({'data': mods, 'pagination': {'index': 0, 'pageSize': 50,
+                                                                  'resultCount': len(mods), 'totalCount': len(mods)}})
+        if endpoint in ('mods/{id}', 'mods/{id}/files'):
+            mod_id = int(parts[2])
+            if not mock.is_mod(mod_id):
+                return self.__send_status(404)
+            if endpoint == 'mods/{id}':
+                return self.__send_json({'data': mock.get_mod_json(mod_id)})
+            return self.__get_files(mod_id, query)
+        self.__send_status(404)
+
+    def do_POST(self):
+        mock: MockCurseForge = self.server.mock
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        endpoint = self.path.strip('/').split('?')[0][len('v1/'):]
+        if not self.__begin('POST ' + endpoint, True):
+            return
+
+        if endpoint == 'mods':
+            return self.__send_json({'data': [mock.get_mod_json(mod_id) for mod_id in body.get('modIds', [])
+                                              if mock.is_mod(mod_id)]})
+        if endpoint == 'fingerprints':
+            mock.index_fingerprints()
+            matches = []
+            unmatched = []
+            for fingerprint in body.get('fingerprints', []):
+                file_id = mock.fingerprints.get(fingerprint)
+                if file_id is None:
+                    unmatched.append(fingerprint)
+                    continue
+                matches.append({'id': file_id // MAX_FILES, 'file': mock.get_file_json(file_id), 'latestFiles': []})
+            return self.__send_json({'data': {'isCacheBuilt': True, 'exactMatches': matches,
+                                              'exactFingerprints': [match['file']['fileFingerprint']
+                                                                    for match in matches],
+                                              'unmatchedFingerprints': unmatched}})
+        self.__send_status(404)
+
+
+def __parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Serves a synthetic CurseForge API and CDN on localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--mods', type=int, default=500)
+    parser.add_argument('--files-per-mod', type=int, default=120)
+    parser.add_argument('--jar-size', type=int, default=64 * 1024, help='bytes of a typical jar')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before every response')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of API requests answered with 429')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = __parse_args()
+    server = MockCurseForge(args.mods, args.files_per_mod, args.jar_size, args.latency, args.throttle_rate)
+    print('Serving %s mods on %s/v1/' % (args.mods, server.start(args.port)))
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+# Optional dependency: resource reports CPU time and peak memory, it is not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from benchmarks.generate import write_mods_list, write_output_folder
+from benchmarks.mock_api import MockCurseForge
+
+# cold: empty output folder and cache. warm: the same run again with the folder and cache of the cold run.
+# populated: a generated folder of current, outdated and missing jars with an empty cache.
+SCENARIOS = ('cold', 'warm', 'populated')
+DEFAULT_SIZES = (50, 500, 5000)
+
+VERSIONS = ['1.16.5']
+EXCLUDED = ['Fabric']
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+#########################################################
+# CHILD FUNCTIONS
+#########################################################
+
+def __get_peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def __get_cpu_time() -> float:
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_child(work_path: str, base_url: str, workers: int, fingerprints: bool):
+    # Runs in its own process, so the CPU time and peak memory are those of the downloader alone
+    import curseforge_cache
+    import curseforge_downloader
+    import curseforge_http
+    import curseforge_metrics
+    import logger
+    from curseforge_api_schemas import FileReleaseType
+
+    curseforge_downloader.CURSEFORGE_API = base_url + '/v1/%s'
+    curseforge_downloader.CURSEFORGE_FILES = base_url + '/files/%s%s/%s'
+    curseforge_cache.db_name = os.path.join(work_path, 'cache.db')
+    logger.configure(logger.LogLevel.WARNING)
+
+    # Interpreter startup and imports are not part of the run
+    start = time.perf_counter()
+    cpu_start = __get_cpu_time()
+    curseforge_cache.connect()
+    curseforge_http.connect(curseforge_http.get_pool_size(workers))
+    downloader = curseforge_downloader.CurseForgeDownloader(
+        os.path.join(work_path, 'mods.txt'), os.path.join(work_path, 'output'), VERSIONS, EXCLUDED,
+        [FileReleaseType.RELEASE, FileReleaseType.BETA], workers=workers, fingerprints=fingerprints)
+    downloader.download_all()
+    curseforge_http.close()
+    curseforge_cache.close()
+    logger.close()
+    wall_time = time.perf_counter() - start
+
+    results = [result for _, result in downloader.process_results]
+    with open(os.path.join(work_path, 'result.json'), 'w') as file:
+        json.dump({
+            'wall_seconds': wall_time,
+            'cpu_seconds': __get_cpu_time() - cpu_start,
+            'peak_rss_kib': __get_peak_rss(),
+            'results': {result: results.count(result) for result in sorted(set(results))},
+            'metrics': curseforge_metrics.get_report(),
+        }, file, indent=4)
+
+
+#########################################################
+# SCENARIO FUNCTIONS
+#########################################################
+
+def __prepare(mock: MockCurseForge, scenario: str, work_path: str):
+    if scenario == 'warm':
+        # Everything of the cold run is kept, only the mods list gets back the state it had before that run
+        write_mods_list(mock, os.path.join(work_path, 'mods.txt'))
+        return
+    shutil.rmtree(work_path, ignore_errors=True)
+    os.makedirs(work_path)
+    write_mods_list(mock, os.path.join(work_path, 'mods.txt'))
+    if scenario == 'populated':
+        write_output_folder(mock, os.path.join(work_path, 'output'))
+
+
+def run_scenario(mock: MockCurseForge, scenario: str, work_path: str, args: argparse.Namespace) -> Dict[str, Any]:
+    __prepare(mock, scenario, work_path)
+    mock.reset_counts()
+    command = [sys.executable, '-m', 'benchmarks.run', '--child', work_path, '--base-url', mock.base_url,
+               '--workers', str(args.workers)]
+    if not args.fingerprints:
+        command.append('--no-fingerprints')
+    # The downloader prints every mod, that output is kept next to the run instead of on the console
+    with open(os.path.join(work_path, '%s.log' % scenario), 'w') as log_file:
+        process = subprocess.run(command, cwd=REPOSITORY_PATH, stdin=subprocess.DEVNULL, stdout=log_file,
+                                 stderr=subprocess.STDOUT)
+    if process.returncode != 0:
+        raise RuntimeError('Scenario %s of %s mods failed, see %s' %
+                           (scenario, mock.mods, os.path.join(work_path, '%s.log' % scenario)))
+
+    with open(os.path.join(work_path, 'result.json')) as file:
+        child = json.load(file)
+    counts = mock.get_counts()
+    metrics = child['metrics']
+    return {
+        'scenario': scenario,
+        'mods': mock.mods,
+        'wall_seconds': child['wall_seconds'],
+        'cpu_seconds': child['cpu_seconds'],
+        'peak_rss_kib': child['peak_rss_kib'],
+        'api_requests': sum(count for endpoint, count in counts.items() if endpoint not in ('download', '429')),
+        'downloads': counts.get('download', 0),
+        'throttled': counts.get('429', 0),
+        'downloaded_bytes': metrics['counters'].get('downloaded_bytes', 0),
+        'requests': counts,
+        'results': child['results'],
+        'phases': metrics['phases'],
+    }
+
+
+def run_all(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    work_folder = args.work_folder or tempfile.mkdtemp(prefix='curseforge-benchmark-')
+    results = []
+    try:
+        for size in args.sizes:
+            mock = MockCurseForge(size, args.files_per_mod, args.jar_size, args.latency, args.throttle_rate)
+            mock.start()
+            try:
+                for scenario in args.scenarios:
+                    # The warm run continues where the cold run of the same size stopped
+                    work_path = os.path.join(work_folder, '%s-%s' % (size, 'cold' if scenario == 'warm' else scenario))
+                    print('Running %s with %s mods...' % (scenario, size))
+                    results.append(run_scenario(mock, scenario, work_path, args))
+                    __print_result(results[-1])
+            finally:
+                mock.stop()
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_folder, ignore_errors=True)
+    return results
+
+
+#########################################################
+# REPORT FUNCTIONS
+#########################################################
+
+def __print_result(result: Dict[str, Any]):
+    print('  %.2fs wall, %.2fs CPU, %s MiB peak RSS, %s API requests, %s downloads (%s KiB), %s throttled' %
+          (result['wall_seconds'], result['cpu_seconds'],
+           result['peak_rss_kib'] // 1024 if result['peak_rss_kib'] is not None else '?',
+           result['api_requests'], result['downloads'], int(result['downloaded_bytes']) // 1024,
+           result['throttled']))
+
+
+def __format_change(current: float, previous: Optional[float]) -> str:
+    if previous is None or previous == 0:
+        return ''
+    return ' (%+.1f%%)' % ((current - previous) / previous * 100)
+
+
+def print_comparison(results: List[Dict[str, Any]], previous_path: str):
+    with open(previous_path) as file:
+        previous = {(result['scenario'], result['mods']): result for result in json.load(file)['results']}
+    print('\n---------------------------------')
+    print('Compared to %s:' % previous_path)
+    for result in results:
+        before = previous.get((result['scenario'], result['mods']))
+        if before is None:
+            print('%s with %s mods: no previous result' % (result['scenario'], result['mods']))
+            continue
+        print('%s with %s mods: wall %.2fs%s, CPU %.2fs%s, peak RSS %s KiB%s, API requests %s%s' %
+              (result['scenario'], result['mods'],
+               result['wall_seconds'], __format_change(result['wall_seconds'], before['wall_seconds']),
+               result['cpu_seconds'], __format_change(result['cpu_seconds'], before['cpu_seconds']),
+               result['peak_rss_kib'], __format_change(result['peak_rss_kib'] or 0, before['peak_rss_kib']),
+               result['api_requests'], __format_change(result['api_requests'], before['api_requests'])))
+
+
+def __parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmarks the downloader against a local mock of the CurseForge API')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='mods per list')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--no-fingerprints', dest='fingerprints', action='store_false')
+    parser.add_argument('--files-per-mod', type=int, default=120)
+    parser.add_argument('--jar-size', type=int, default=64 * 1024, help='bytes of a typical jar')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds before every response')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of API requests answered with 429')
+    parser.add_argument('--work-folder', help='where the mods lists and output folders are created')
+    parser.add_argument('--keep', action='store_true', help='keep the work folder and the logs of every run')
+    parser.add_argument('--save', help='save the results as JSON to this file')
+    parser.add_argument('--compare', help='compare with the results saved by an earlier run')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = __parse_args()
+    if arguments.child is not None:
+        run_child(arguments.child, arguments.base_url, arguments.workers, arguments.fingerprints)
+        sys.exit(0)
+
+    if 'warm' in arguments.scenarios and 'cold' not in arguments.scenarios:
+        arguments.scenarios.insert(0, 'cold')
+    # The warm run needs the cold run before it
+    arguments.scenarios.sort(key=SCENARIOS.index)
+    all_results = run_all(arguments)
+    if arguments.save is not None:
+        with open(arguments.save, 'w') as save_file:
+            json.dump({'started': time.time(), 'settings': {key: value for key, value in vars(arguments).items()
+                                                            if key not in ('child', 'base_url')},
+                       'results': all_results}, save_file, indent=4)
+    if arguments.compare is not None:
+        print_comparison(all_results, arguments.compare)
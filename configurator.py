@@ -1,22 +1,198 @@
-import curseforge_dl
 import configparser
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from curseforge_api_schemas import FileReleaseType
+from logger import LogLevel
 
 SECTION_DIRECTORIES = 'Directories'
 KEY_MODS_FILE = 'ModsFile'
 KEY_OUTPUT_FOLDER = 'OutputFolder'
+KEY_STORE_FOLDER = 'StoreFolder'
+KEY_SNAPSHOT_FILE = 'SnapshotFile'
 
 SECTION_FILTERS = 'Filters'
 KEY_VERSIONS = 'Versions'
 KEY_EXCLUDED_VERSIONS = 'ExcludedVersions'
+KEY_TYPES = 'Types'
+KEY_PREFER_STABLE_TYPE = 'PreferStableType'
 
 SECTION_EXECUTION = 'Execution'
-KEY = 'ExecutionType'
+KEY_EXECUTION_TYPE = 'ExecutionType'
+KEY_PLAN_FILE = 'PlanFile'
+KEY_OFFLINE = 'Offline'
+KEY_REQUEST_MISSING_IDS = 'RequestMissingIDs'
+KEY_MAX_RETRIES = 'MaxRetries'
+
+SECTION_PERFORMANCE = 'Performance'
+KEY_WORKERS = 'Workers'
+KEY_CONNECT_TIMEOUT = 'ConnectTimeout'
+KEY_READ_TIMEOUT = 'ReadTimeout'
+KEY_REQUESTS_PER_SECOND = 'RequestsPerSecond'
+KEY_BULK_SIZE = 'BulkSize'
+KEY_SERVER_SIDE_FILTER = 'ServerSideFilter'
+KEY_LISTING_TTL = 'ListingTTL'
+KEY_FINGERPRINTS = 'Fingerprints'
+KEY_BUFFER_SIZE = 'BufferSize'
+KEY_MAX_DOWNLOADS = 'MaxDownloads'
+KEY_BANDWIDTH_LIMIT = 'BandwidthLimit'
+KEY_MAX_SEARCHES = 'MaxSearches'
+KEY_SEARCH_SIZE = 'SearchSize'
+KEY_UNRESOLVED_TTL = 'UnresolvedTTL'
+
+SECTION_LOGGING = 'Logging'
+KEY_LOG_LEVEL = 'LogLevel'
+KEY_LOG_FILE = 'LogFile'
+KEY_LOG_JSON_FILE = 'LogJsonFile'
+KEY_REPORT_FILE = 'ReportFile'
+KEY_PROMETHEUS_FILE = 'PrometheusFile'
+
+# Every section named "Profile <name>" is one more mods list. Its keys override the keys of the other sections.
+PROFILE_PREFIX = 'Profile '
+DEFAULT_PROFILE = 'Default'
+
+EXECUTION_TYPES = ('DOWNLOAD', 'UPDATE', 'CHECK')
+
+
+@dataclass(frozen=True)
+class Settings:
+    workers: int
+    connect_timeout: float
+    read_timeout: float
+    requests_per_second: float
+    max_retries: int
+    bulk_size: int
+    server_side_filter: bool
+    listing_ttl: float  # seconds
+    fingerprints: bool
+    buffer_size: int
+    max_downloads: int
+    bandwidth_limit: int
+    max_searches: int
+    search_size: int
+    unresolved_ttl: float  # seconds
+    store_folder: Optional[str]
+    snapshot_file: Optional[str]
+    log_level: LogLevel
+    log_file: Optional[str]
+    log_json_file: Optional[str]
+    report_file: Optional[str]
+    prometheus_file: Optional[str]
+
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    mods_file: str
+    output_folder: str
+    versions: List[str]
+    excluded_versions: List[str]
+    release_types: List[FileReleaseType]
+    execution_type: str
+    plan_file: Optional[str]
+    offline: bool
+    request_missing_ids: bool
+
+
+#########################################################
+# VALUE FUNCTIONS
+#########################################################
+
+def __get(config: configparser.ConfigParser, sections: List[str], key: str, fallback: str = None) -> Optional[str]:
+    for section in sections:
+        if config.has_option(section, key):
+            value = config.get(section, key).strip().strip('"').strip()
+            return value if len(value) != 0 else None
+    return fallback
+
+
+def __get_bool(config: configparser.ConfigParser, sections: List[str], key: str, fallback: bool) -> bool:
+    value = __get(config, sections, key)
+    return value.lower() == 'true' if value is not None else fallback
+
+
+def __get_list(config: configparser.ConfigParser, sections: List[str], key: str) -> List[str]:
+    value = __get(config, sections, key)
+    return json.loads(value) if value is not None else []
+
+
+def __get_release_types(config: configparser.ConfigParser, sections: List[str]) -> List[FileReleaseType]:
+    # The stable types are preferred in the order release, beta, alpha when PreferStableType is set
+    if __get_bool(config, sections, KEY_PREFER_STABLE_TYPE, False):
+        return [FileReleaseType.RELEASE, FileReleaseType.BETA, FileReleaseType.ALPHA]
+    return [FileReleaseType[name.upper()] for name in __get_list(config, sections, KEY_TYPES)]
+
+
+#########################################################
+# READ FUNCTIONS
+#########################################################
+
+def __read_settings(config: configparser.ConfigParser) -> Settings:
+    sections = [SECTION_PERFORMANCE, SECTION_EXECUTION, SECTION_DIRECTORIES, SECTION_LOGGING]
+    return Settings(
+        workers=int(__get(config, sections, KEY_WORKERS, '1')),
+        connect_timeout=float(__get(config, sections, KEY_CONNECT_TIMEOUT, '10')),
+        read_timeout=float(__get(config, sections, KEY_READ_TIMEOUT, '60')),
+        requests_per_second=float(__get(config, sections, KEY_REQUESTS_PER_SECOND, '0')),
+        max_retries=int(__get(config, sections, KEY_MAX_RETRIES, '5')),
+        bulk_size=int(__get(config, sections, KEY_BULK_SIZE, '50')),
+        server_side_filter=__get_bool(config, sections, KEY_SERVER_SIDE_FILTER, True),
+        listing_ttl=float(__get(config, sections, KEY_LISTING_TTL, '24')) * 60 * 60,
+        fingerprints=__get_bool(config, sections, KEY_FINGERPRINTS, True),
+        buffer_size=int(__get(config, sections, KEY_BUFFER_SIZE, str(1024 * 1024))),
+        max_downloads=int(__get(config, sections, KEY_MAX_DOWNLOADS, '0')),
+        bandwidth_limit=int(__get(config, sections, KEY_BANDWIDTH_LIMIT, '0')),
+        max_searches=int(__get(config, sections, KEY_MAX_SEARCHES, '10')),
+        search_size=int(__get(config, sections, KEY_SEARCH_SIZE, '50')),
+        unresolved_ttl=float(__get(config, sections, KEY_UNRESOLVED_TTL, '168')) * 60 * 60,
+        store_folder=__get(config, sections, KEY_STORE_FOLDER),
+        snapshot_file=__get(config, sections, KEY_SNAPSHOT_FILE),
+        log_level=LogLevel[__get(config, sections, KEY_LOG_LEVEL, 'INFO').upper()],
+        log_file=__get(config, sections, KEY_LOG_FILE),
+        log_json_file=__get(config, sections, KEY_LOG_JSON_FILE),
+        report_file=__get(config, sections, KEY_REPORT_FILE),
+        prometheus_file=__get(config, sections, KEY_PROMETHEUS_FILE),
+    )
+
+
+def __read_profile(config: configparser.ConfigParser, name: str, section: Optional[str]) -> Profile:
+    sections = [SECTION_DIRECTORIES, SECTION_FILTERS, SECTION_EXECUTION]
+    if section is not None:
+        sections.insert(0, section)
+    execution_type = __get(config, sections, KEY_EXECUTION_TYPE, 'DOWNLOAD').upper()
+    if execution_type not in EXECUTION_TYPES:
+        raise ValueError('Unknown execution type of profile "%s": %s' % (name, execution_type))
+    return Profile(
+        name=name,
+        mods_file=__get(config, sections, KEY_MODS_FILE),
+        output_folder=__get(config, sections, KEY_OUTPUT_FOLDER),
+        versions=__get_list(config, sections, KEY_VERSIONS),
+        excluded_versions=__get_list(config, sections, KEY_EXCLUDED_VERSIONS),
+        release_types=__get_release_types(config, sections),
+        execution_type=execution_type,
+        plan_file=__get(config, sections, KEY_PLAN_FILE),
+        offline=__get_bool(config, sections, KEY_OFFLINE, False),
+        request_missing_ids=__get_bool(config, sections, KEY_REQUEST_MISSING_IDS, True),
+    )
 
 
-def read_config(path=None):
+def read_config(path=None) -> Optional[Tuple[Settings, List[Profile]]]:
     if path is None:
         print('Path to properties file has not been set in code')
-        return
+        return None
     config = configparser.ConfigParser()
-    config.read(path)
+    # Keys are case sensitive, just like they are written in the properties file
+    config.optionxform = str
+    if len(config.read(path)) == 0:
+        print('Properties file could not be read: %s' % path)
+        return None
 
+    # Without any profile sections the other sections describe a single mods list
+    profile_sections = [section for section in config.sections() if section.startswith(PROFILE_PREFIX)]
+    if len(profile_sections) == 0:
+        profiles = [__read_profile(config, DEFAULT_PROFILE, None)]
+    else:
+        profiles = [__read_profile(config, section[len(PROFILE_PREFIX):].strip(), section)
+                    for section in profile_sections]
+    return __read_settings(config), profiles
@@ -32,3 +32,18 @@ class FileRelationType(Enum):
     TOOL = 4
     INCOMPATIBLE = 5
     INCLUDE = 6
+
+
+class ModLoaderType(Enum):
+    ANY = 0
+    FORGE = 1
+    CAULDRON = 2
+    LITE_LOADER = 3
+    FABRIC = 4
+    QUILT = 5
+    NEO_FORGE = 6
+
+
+class HashAlgo(Enum):
+    SHA1 = 1
+    MD5 = 2
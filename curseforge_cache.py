@@ -1,11 +1,19 @@
+import json
+import os
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from sqlite3 import Connection
-from typing import Any
+from typing import Any, Dict, List, Optional, Tuple
 
+import curseforge_metrics
 import logger
 
 db_name = 'cache.db'
 db: Connection
+# The connection is shared between the downloader's worker threads
+lock = threading.RLock()
 
 TABLE_GAMES = 'Games'
 TABLE_CATEGORIES = 'Categories'
@@ -15,6 +23,99 @@ ROW_ID = 'ID'
 ROW_SLUG = 'Slug'
 ROW_NAME = 'Name'
 
+# The files chosen for each mod during the last run, per output folder
+TABLE_MANIFEST = 'Manifest'
+# The compact file listing of each mod, per set of server-side filters
+TABLE_LISTINGS = 'Listings'
+# The fingerprint of each local jar and the CurseForge file it matched
+TABLE_FINGERPRINTS = 'Fingerprints'
+# The blob of the shared jar store that each file of an output folder is linked to
+TABLE_STORE_REFS = 'StoreRefs'
+# The slugs that no search could resolve to a mod, and why
+TABLE_UNRESOLVED = 'Unresolved'
+
+# Stored in the database as its user_version once every table exists. Increase it whenever a table is added or
+# changed, so that caches of older versions get the new tables.
+SCHEMA_VERSION = 1
+
+# Writes are committed together once this many are pending, or when flush() is called
+FLUSH_SIZE = 100
+# The maximum amount of rows kept in memory in front of the database
+MEMORY_SIZE = 4096
+
+pending_writes = 0
+# Lookups of this run that found a row or listing, and the ones that did not. Worker threads count them together.
+hits = 0
+misses = 0
+stats_lock = threading.Lock()
+
+
+class LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: Any, value: Any):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# (table, selecting row, key) -> (id, slug, name)
+memory = LRUCache(MEMORY_SIZE)
+
+
+#########################################################
+# STATEMENTS
+#########################################################
+
+# Statements are built once so sqlite3 can reuse its prepared statement for every call
+SQL_SELECT = {
+    (table, selecting_row): "SELECT `%s`, `%s`, `%s` FROM `%s` WHERE `%s`=?;" %
+                            (ROW_ID, ROW_SLUG, ROW_NAME, table, selecting_row)
+    for table in (TABLE_GAMES, TABLE_CATEGORIES, TABLE_MODS)
+    for selecting_row in (ROW_ID, ROW_SLUG)
+}
+SQL_SELECT_ALL = {
+    table: "SELECT `%s`, `%s`, `%s` FROM `%s`;" % (ROW_ID, ROW_SLUG, ROW_NAME, table)
+    for table in (TABLE_GAMES, TABLE_CATEGORIES, TABLE_MODS)
+}
+SQL_INSERT = {
+    table: "INSERT OR IGNORE INTO `%s` (`%s`, `%s`, `%s`) VALUES (?, ?, ?);" % (table, ROW_ID, ROW_SLUG, ROW_NAME)
+    for table in (TABLE_GAMES, TABLE_CATEGORIES, TABLE_MODS)
+}
+SQL_SELECT_MANIFEST = "SELECT `ModID`, `FileID`, `FileName`, `FileDate`, `FileLength`, `Hash`, `DateModified`, " \
+                      "`Filter` FROM `%s` WHERE `OutputPath`=?;" % TABLE_MANIFEST
+SQL_INSERT_MANIFEST = "INSERT OR REPLACE INTO `%s` VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);" % TABLE_MANIFEST
+SQL_SELECT_LISTING = "SELECT `FetchedAt`, `DateModified`, `LatestFileID`, `Complete`, `Files` FROM `%s` " \
+                     "WHERE `ModID`=? AND `Filter`=?;" % TABLE_LISTINGS
+SQL_INSERT_LISTING = "INSERT OR REPLACE INTO `%s` VALUES (?, ?, ?, ?, ?, ?, ?);" % TABLE_LISTINGS
+SQL_TOUCH_LISTING = "UPDATE `%s` SET `FetchedAt`=? WHERE `ModID`=? AND `Filter`=?;" % TABLE_LISTINGS
+SQL_SELECT_FINGERPRINTS = "SELECT `FileName`, `Size`, `MTime`, `Fingerprint`, `ModID`, `FileID` FROM `%s` " \
+                          "WHERE `Folder`=?;" % TABLE_FINGERPRINTS
+SQL_DELETE_FINGERPRINT = "DELETE FROM `%s` WHERE `Folder`=? AND `FileName`=?;" % TABLE_FINGERPRINTS
+SQL_INSERT_FINGERPRINT = "INSERT OR REPLACE INTO `%s` VALUES (?, ?, ?, ?, ?, ?, ?);" % TABLE_FINGERPRINTS
+SQL_SELECT_STORE_REFS = "SELECT `Blob`, `OutputPath`, `FileName` FROM `%s`;" % TABLE_STORE_REFS
+SQL_DELETE_STORE_REF = "DELETE FROM `%s` WHERE `OutputPath`=? AND `FileName`=?;" % TABLE_STORE_REFS
+SQL_INSERT_STORE_REF = "INSERT OR REPLACE INTO `%s` VALUES (?, ?, ?);" % TABLE_STORE_REFS
+SQL_SELECT_UNRESOLVED = "SELECT `Reason`, `FailedAt`, `Attempts` FROM `%s` WHERE `Slug`=?;" % TABLE_UNRESOLVED
+SQL_INSERT_UNRESOLVED = "INSERT OR REPLACE INTO `%s` VALUES (?, ?, ?, ?);" % TABLE_UNRESOLVED
+SQL_DELETE_UNRESOLVED = "DELETE FROM `%s` WHERE `Slug`=?;" % TABLE_UNRESOLVED
+
 
 def __create_table(table_name: str):
     db.execute('''
@@ -25,33 +126,206 @@ def __create_table(table_name: str):
     );''' % (table_name, ROW_ID, ROW_SLUG, ROW_NAME))
 
 
-def connect():
-    global db
-    db = sqlite3.connect(db_name)
+def __create_manifest_table():
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS `%s`(
+    `OutputPath` TEXT NOT NULL,
+    `ModID` INT NOT NULL,
+    `FileID` INT NOT NULL,
+    `FileName` TEXT NOT NULL,
+    `FileDate` TEXT NOT NULL,
+    `FileLength` INT NOT NULL,
+    `Hash` TEXT,
+    `DateModified` TEXT,
+    `Filter` TEXT NOT NULL,
+    PRIMARY KEY (`OutputPath`, `ModID`)
+    );''' % TABLE_MANIFEST)
+
+
+def __create_listings_table():
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS `%s`(
+    `ModID` INT NOT NULL,
+    `Filter` TEXT NOT NULL,
+    `FetchedAt` REAL NOT NULL,
+    `DateModified` TEXT,
+    `LatestFileID` INT,
+    `Complete` INT NOT NULL,
+    `Files` TEXT NOT NULL,
+    PRIMARY KEY (`ModID`, `Filter`)
+    );''' % TABLE_LISTINGS)
+
+
+def __create_fingerprints_table():
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS `%s`(
+    `Folder` TEXT NOT NULL,
+    `FileName` TEXT NOT NULL,
+    `Size` INT NOT NULL,
+    `MTime` REAL NOT NULL,
+    `Fingerprint` INT NOT NULL,
+    `ModID` INT,
+    `FileID` INT,
+    PRIMARY KEY (`Folder`, `FileName`)
+    );''' % TABLE_FINGERPRINTS)
+
+
+def __create_store_refs_table():
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS `%s`(
+    `Blob` TEXT NOT NULL,
+    `OutputPath` TEXT NOT NULL,
+    `FileName` TEXT NOT NULL,
+    PRIMARY KEY (`OutputPath`, `FileName`)
+    );''' % TABLE_STORE_REFS)
+
+
+def __create_unresolved_table():
+    db.execute('''
+    CREATE TABLE IF NOT EXISTS `%s`(
+    `Slug` TEXT NOT NULL,
+    `Reason` TEXT NOT NULL,
+    `FailedAt` REAL NOT NULL,
+    `Attempts` INT NOT NULL,
+    PRIMARY KEY (`Slug`)
+    );''' % TABLE_UNRESOLVED)
+
+
+def __create_schema():
+    # A cache of the current version already has every table
+    if db.execute('PRAGMA user_version;').fetchone()[0] == SCHEMA_VERSION:
+        return
     __create_table(TABLE_GAMES)
     __create_table(TABLE_CATEGORIES)
     __create_table(TABLE_MODS)
+    __create_manifest_table()
+    __create_listings_table()
+    __create_fingerprints_table()
+    __create_store_refs_table()
+    __create_unresolved_table()
+    db.execute('PRAGMA user_version=%s;' % SCHEMA_VERSION)
+    db.commit()
+    logger.log_info('(Cache) Created the tables of schema version %s' % SCHEMA_VERSION)
+
+
+#########################################################
+# CONNECTION FUNCTIONS
+#########################################################
+
+def connect():
+    global db
+    with lock:
+        db = sqlite3.connect(db_name, check_same_thread=False)
+        # WAL lets a commit append to the log instead of rewriting pages, NORMAL only syncs at checkpoints
+        db.execute('PRAGMA journal_mode=WAL;')
+        db.execute('PRAGMA synchronous=NORMAL;')
+        __create_schema()
     logger.log_info('(Cache) Connected to cache database successfully')
 
 
+def flush():
+    global pending_writes
+    with lock:
+        if pending_writes == 0:
+            return
+        with curseforge_metrics.phase('cache_commit'):
+            db.commit()
+        logger.log_info('(Cache) Committed %s pending writes' % pending_writes)
+        pending_writes = 0
+
+
+def __count_lookup(found: bool):
+    global hits, misses
+    with stats_lock:
+        if found:
+            hits += 1
+        else:
+            misses += 1
+
+
+def get_stats() -> Dict[str, float]:
+    lookups = hits + misses
+    return {
+        'cache_hits': hits,
+        'cache_misses': misses,
+        'cache_hit_ratio': hits / lookups if lookups != 0 else 0.0,
+        'cache_memory_rows': len(memory.entries),
+    }
+
+
+curseforge_metrics.register_collector(get_stats)
+
+
 def close():
-    db.close()
+    with lock:
+        flush()
+        db.close()
+    memory.clear()
+
+
+def __written(count: int):
+    global pending_writes
+    pending_writes += count
+    if pending_writes >= FLUSH_SIZE:
+        flush()
+
+
+#########################################################
+# ROW FUNCTIONS
+#########################################################
+
+def __remember(table: str, row: Tuple[int, str, str]):
+    memory.put((table, ROW_ID, row[0]), row)
+    memory.put((table, ROW_SLUG, row[1]), row)
+
+
+def __normalize_key(selecting_row: str, key: Any) -> Any:
+    if selecting_row == ROW_ID:
+        return int(key)
+    return key
 
 
 def insert(table: str, id_key: int, slug: str, name: str):
-    name = name.replace('\'', '\'\'')
-    db.execute("INSERT INTO `%s` VALUES ('%s', '%s', '%s');" % (table, id_key, slug, name))
-    db.commit()
-    logger.log_info('(Cache) Saved %s, %s into table %s' % (id_key, slug, table))
+    insert_many(table, [(id_key, slug, name)])
+
+
+def insert_many(table: str, rows: List[Tuple[int, str, str]]):
+    if len(rows) == 0:
+        return
+    written = []
+    with lock:
+        for row in rows:
+            # A row that already exists is kept, so only the rows that were inserted are remembered
+            if db.execute(SQL_INSERT[table], row).rowcount == 1:
+                written.append(row)
+        __written(len(written))
+    for row in written:
+        __remember(table, (int(row[0]), row[1], row[2]))
+
+
+def select_row(table: str, key: Any, selecting_row: str) -> Optional[Tuple[int, str, str]]:
+    key = __normalize_key(selecting_row, key)
+    row = memory.get((table, selecting_row, key))
+    if row is not None:
+        __count_lookup(True)
+        return row
+    start = time.perf_counter()
+    with lock:
+        row = db.execute(SQL_SELECT[(table, selecting_row)], (key,)).fetchone()
+    curseforge_metrics.observe('cache_query', table, time.perf_counter() - start)
+    __count_lookup(row is not None)
+    if row is None:
+        return None
+    row = (int(row[0]), row[1], row[2])
+    __remember(table, row)
+    return row
 
 
-def select(table: str, row: str, slug: str, selecting_row: str) -> Any:
-    result = db.execute("SELECT `%s` FROM `%s` WHERE `%s`='%s';" % (row, table, selecting_row, slug))
-    fetched = result.fetchone()
-    if result is None or fetched is None:
+def select(table: str, row: str, key: Any, selecting_row: str) -> Any:
+    fetched = select_row(table, key, selecting_row)
+    if fetched is None:
         return None
-    logger.log_info('(Cache) Retrieved %s %s of \"%s\" via cache: %s' % (table, row, slug, fetched[0]))
-    return fetched[0]
+    return fetched[(ROW_ID, ROW_SLUG, ROW_NAME).index(row)]
 
 
 def get_game_id(slug: str):
@@ -78,15 +352,15 @@ def get_mod_name(slug: str):
     return select(TABLE_MODS, ROW_NAME, slug, ROW_SLUG)
 
 
-def get_game_slug(game_id: str):
+def get_game_slug(game_id: int):
     return select(TABLE_GAMES, ROW_SLUG, game_id, ROW_ID)
 
 
-def get_category_slug(category_id: str):
+def get_category_slug(category_id: int):
     return select(TABLE_CATEGORIES, ROW_SLUG, category_id, ROW_ID)
 
 
-def get_mod_slug(mod_id: str):
+def get_mod_slug(mod_id: int):
     return select(TABLE_MODS, ROW_SLUG, mod_id, ROW_ID)
 
 
@@ -100,3 +374,199 @@ def add_category(id_key: int, slug: str, name: str):
 
 def add_mod(id_key: int, slug: str, name: str):
     insert(TABLE_MODS, id_key, slug, name)
+
+
+def add_games(rows: List[Tuple[int, str, str]]):
+    insert_many(TABLE_GAMES, rows)
+
+
+def add_categories(rows: List[Tuple[int, str, str]]):
+    insert_many(TABLE_CATEGORIES, rows)
+
+
+def add_mods(rows: List[Tuple[int, str, str]]):
+    insert_many(TABLE_MODS, rows)
+
+
+#########################################################
+# MANIFEST FUNCTIONS
+#########################################################
+
+def get_manifest(output_path: str) -> Dict[int, Dict[str, Any]]:
+    with lock:
+        rows = db.execute(SQL_SELECT_MANIFEST, (output_path,)).fetchall()
+    manifest = {}
+    for row in rows:
+        manifest[row[0]] = {
+            'file_id': row[1],
+            'file_name': row[2],
+            'file_date': row[3],
+            'file_length': row[4],
+            'hash': row[5],
+            'date_modified': row[6],
+            'filter': row[7],
+        }
+    logger.log_info('(Cache) Loaded manifest of %s mods for: %s' % (len(manifest), output_path))
+    return manifest
+
+
+def set_manifest_entry(output_path: str, mod_id: int, file_id: int, file_name: str, file_date: str,
+                       file_length: int, file_hash: Optional[str], date_modified: Optional[str], filter_key: str):
+    with lock:
+        db.execute(SQL_INSERT_MANIFEST, (output_path, mod_id, file_id, file_name, file_date, file_length, file_hash,
+                                         date_modified, filter_key))
+        __written(1)
+
+
+#########################################################
+# LISTING FUNCTIONS
+#########################################################
+
+def get_listing(mod_id: int, filter_key: str) -> Optional[Dict[str, Any]]:
+    start = time.perf_counter()
+    with lock:
+        row = db.execute(SQL_SELECT_LISTING, (mod_id, filter_key)).fetchone()
+    curseforge_metrics.observe('cache_query', TABLE_LISTINGS, time.perf_counter() - start)
+    __count_lookup(row is not None)
+    if row is None:
+        return None
+    return {
+        'fetched_at': row[0],
+        'date_modified': row[1],
+        'latest_file_id': row[2],
+        'complete': bool(row[3]),
+        'files': json.loads(row[4]),
+    }
+
+
+def set_listing(mod_id: int, filter_key: str, fetched_at: float, date_modified: Optional[str],
+                latest_file_id: Optional[int], complete: bool, files: List[Dict[str, Any]]):
+    files_text = json.dumps(files, separators=(',', ':'))
+    with lock:
+        db.execute(SQL_INSERT_LISTING, (mod_id, filter_key, fetched_at, date_modified, latest_file_id, int(complete),
+                                        files_text))
+        __written(1)
+
+
+def touch_listing(mod_id: int, filter_key: str, fetched_at: float):
+    with lock:
+        db.execute(SQL_TOUCH_LISTING, (fetched_at, mod_id, filter_key))
+        __written(1)
+
+
+#########################################################
+# UNRESOLVED FUNCTIONS
+#########################################################
+
+def get_unresolved(slug: str) -> Optional[Dict[str, Any]]:
+    with lock:
+        row = db.execute(SQL_SELECT_UNRESOLVED, (slug,)).fetchone()
+    if row is None:
+        return None
+    return {'reason': row[0], 'failed_at': row[1], 'attempts': row[2]}
+
+
+def set_unresolved(slug: str, reason: str, failed_at: float):
+    with lock:
+        # Attempts keep counting up while the slug stays unresolved between runs
+        previous = get_unresolved(slug)
+        attempts = previous['attempts'] + 1 if previous is not None else 1
+        db.execute(SQL_INSERT_UNRESOLVED, (slug, reason, failed_at, attempts))
+        __written(1)
+
+
+def remove_unresolved(slug: str):
+    with lock:
+        db.execute(SQL_DELETE_UNRESOLVED, (slug,))
+        __written(1)
+
+
+#########################################################
+# FINGERPRINT FUNCTIONS
+#########################################################
+
+def get_fingerprints(folder_path: str) -> Dict[str, Dict[str, Any]]:
+    with lock:
+        rows = db.execute(SQL_SELECT_FINGERPRINTS, (folder_path,)).fetchall()
+    fingerprints = {}
+    for row in rows:
+        fingerprints[row[0]] = {
+            'size': row[1],
+            'mtime': row[2],
+            'fingerprint': row[3],
+            'mod_id': row[4],
+            'file_id': row[5],
+        }
+    return fingerprints
+
+
+def set_fingerprint(folder_path: str, file_name: str, size: int, mtime: float, fingerprint: int,
+                    mod_id: Optional[int], file_id: Optional[int]):
+    with lock:
+        db.execute(SQL_INSERT_FINGERPRINT, (folder_path, file_name, size, mtime, fingerprint, mod_id, file_id))
+        __written(1)
+
+
+def remove_fingerprints(folder_path: str, file_names: List[str]):
+    if len(file_names) == 0:
+        return
+    with lock:
+        db.executemany(SQL_DELETE_FINGERPRINT, [(folder_path, file_name) for file_name in file_names])
+        __written(len(file_names))
+
+
+#########################################################
+# STORE FUNCTIONS
+#########################################################
+
+def get_store_refs() -> List[Tuple[str, str, str]]:
+    with lock:
+        return db.execute(SQL_SELECT_STORE_REFS).fetchall()
+
+
+def add_store_ref(blob: str, output_path: str, file_name: str):
+    with lock:
+        db.execute(SQL_INSERT_STORE_REF, (blob, output_path, file_name))
+        __written(1)
+
+
+def remove_store_refs(refs: List[Tuple[str, str]]):
+    if len(refs) == 0:
+        return
+    with lock:
+        db.executemany(SQL_DELETE_STORE_REF, refs)
+        __written(len(refs))
+
+
+#########################################################
+# SNAPSHOT FUNCTIONS
+#########################################################
+
+def save_snapshot(file_path: str):
+    # Games, categories and mods by slug, so a machine without this cache can start without any lookup queries
+    with lock:
+        snapshot = {table: db.execute(SQL_SELECT_ALL[table]).fetchall()
+                    for table in (TABLE_GAMES, TABLE_CATEGORIES, TABLE_MODS)}
+    temp_path = file_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(snapshot, file, separators=(',', ':'))
+    os.replace(temp_path, file_path)
+    logger.log_info('(Cache) Saved snapshot of %s games, %s categories and %s mods' %
+                    tuple(len(snapshot[table]) for table in (TABLE_GAMES, TABLE_CATEGORIES, TABLE_MODS)))
+
+
+def load_snapshot(file_path: str):
+    if not os.path.isfile(file_path):
+        return
+    try:
+        with open(file_path) as file:
+            snapshot = json.load(file)
+    except (OSError, ValueError) as e:
+        logger.log_warning('(Cache) Unable to read snapshot %s: %s' % (file_path, e))
+        return
+    # Mods first, so the few games and categories are the most recent rows of the memory cache
+    for table in (TABLE_MODS, TABLE_CATEGORIES, TABLE_GAMES):
+        insert_many(table, [tuple(row) for row in snapshot.get(table, [])])
+    flush()
+    logger.log_info('(Cache) Loaded snapshot of %s games, %s categories and %s mods' %
+                    tuple(len(snapshot.get(table, [])) for table in (TABLE_GAMES, TABLE_CATEGORIES, TABLE_MODS)))
@@ -0,0 +1,91 @@
+import os
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+def normalize_name(name: str) -> str:
+    return name.lower().replace(' ', '').replace('-', '').replace('.', '')
+
+
+class OutputCatalog:
+    folder_path: str
+    ignored_suffix: str
+    entries: Dict[str, Tuple[int, float]]  # name, (size, modified time)
+    prefixes: List[Tuple[str, str]]  # (normalized name, name), sorted for prefix searches
+
+    def __init__(self, folder_path: str, ignored_suffix: str):
+        self.folder_path = folder_path
+        self.ignored_suffix = ignored_suffix
+        self.entries = dict()
+        self.prefixes = list()
+        self.lock = threading.RLock()
+        self.scan()
+
+    #########################################################
+    # INDEX FUNCTIONS
+    #########################################################
+
+    def scan(self):
+        entries = {}
+        # A folder that does not exist yet is empty, it is only created once something is downloaded.
+        # A single scandir pass; the stat results are kept so no file is stat'ed again
+        if os.path.isdir(self.folder_path):
+            with os.scandir(self.folder_path) as scanner:
+                for entry in scanner:
+                    if entry.name.endswith(self.ignored_suffix) or not entry.is_file():
+                        continue
+                    entry_stat = entry.stat()
+                    entries[entry.name] = (entry_stat.st_size, entry_stat.st_mtime)
+        with self.lock:
+            self.entries = entries
+            self.prefixes = sorted((normalize_name(name), name) for name in entries)
+
+    def add(self, name: str):
+        file_stat = os.stat(os.path.join(self.folder_path, name))
+        with self.lock:
+            if name not in self.entries:
+                insort(self.prefixes, (normalize_name(name), name))
+            self.entries[name] = (file_stat.st_size, file_stat.st_mtime)
+
+    def remove(self, name: str):
+        with self.lock:
+            if name not in self.entries:
+                return
+            del self.entries[name]
+            index = bisect_left(self.prefixes, (normalize_name(name), name))
+            if index < len(self.prefixes) and self.prefixes[index][1] == name:
+                del self.prefixes[index]
+
+    #########################################################
+    # LOOKUP FUNCTIONS
+    #########################################################
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def names(self) -> List[str]:
+        with self.lock:
+            return list(self.entries)
+
+    def find_prefix(self, normalized_prefix: str) -> List[str]:
+        with self.lock:
+            index = bisect_left(self.prefixes, (normalized_prefix, ''))
+            result = []
+            while index < len(self.prefixes) and self.prefixes[index][0].startswith(normalized_prefix):
+                result.append(self.prefixes[index][1])
+                index += 1
+            return result
+
+    def get_size(self, name: str) -> Optional[int]:
+        entry = self.entries.get(name)
+        return entry[0] if entry is not None else None
+
+    def get_mtime(self, name: str) -> Optional[float]:
+        entry = self.entries.get(name)
+        return entry[1] if entry is not None else None
+
+    def get_datetime(self, name: str) -> Optional[datetime]:
+        mtime = self.get_mtime(name)
+        return datetime.fromtimestamp(mtime) if mtime is not None else None
@@ -1,31 +1,29 @@
 import json
-import urllib.request
-import urllib.parse
-import urllib.error
+import hashlib
 import os
-from pathlib import Path
+import re
+import sys
+from array import array
 from datetime import datetime
 import time
-from typing import List, Dict, Optional, Any, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Tuple, Set
 from enum import Enum
-import requests
-from dotenv import load_dotenv
 
-from curseforge_api_schemas import FileRelationType, FileStatus, FileReleaseType
+from curseforge_api_schemas import FileRelationType, FileStatus, FileReleaseType, ModLoaderType, HashAlgo
 import logger
 import curseforge_cache
-
-load_dotenv(os.path.join(os.getcwd(), '.env'))
-
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-    'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
-    'Accept-Encoding': 'none',
-    'Accept-Language': 'en-US,en;q=0.8',
-    'Connection': 'keep-alive',
-    'x-api-key': os.environ.get('ETERNAL_API_KEY')
-}
+import curseforge_http
+import curseforge_fingerprint
+import curseforge_metrics
+from curseforge_files import FileRecord
+from curseforge_filter import FileFilter
+from curseforge_catalog import OutputCatalog, normalize_name
+from curseforge_plan import Plan, ModPlan, PlannedFile, PlanAction
+from curseforge_scheduler import DownloadScheduler
+from curseforge_store import JarStore
+from curseforge_resolver import SharedResolver
 
 # Constants for Curseforge and APIs in case of change
 CURSEFORGE = 'curseforge.com'
@@ -33,6 +31,24 @@ CURSEFORGE_LINK = 'https://www.curseforge.com/%s/%s/%s'
 CURSEFORGE_FILES = 'https://mediafilez.forgecdn.net/files/%s/%s/%s'
 CURSEFORGE_API = 'https://api.curseforge.com/v1/%s'
 
+# The API returns at most this many games or files per page, and no files past index 10000
+GAMES_PAGE_SIZE = 50
+FILES_PAGE_SIZE = 50
+FILES_MAX_INDEX = 10000
+# Searches return at most this many mods per page, and no mods past index 10000
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_INDEX = 10000
+# Searches by slug only return the mods that have the slug, in every class
+SLUG_SEARCH_SIZE = 10
+
+# Words at the end of a slug that the name of a mod often leaves out, like a mod loader or a version
+SLUG_SUFFIX_PATTERN = re.compile(r'(-(forge|fabric|quilt|neoforge|mod|mc|port|reforged|\d+(-\d+)*))+$')
+# The reason of an unresolved mod whose searches all failed. It is not remembered, the next run searches again.
+SEARCH_FAILED_REASON = 'search queries failed'
+
+# Downloads are streamed into this file next to the final file and renamed once they are verified
+DOWNLOAD_SUFFIX = '.part'
+
 
 class CurseForgeDownloader:
     class DownloadStatus(Enum):
@@ -45,14 +61,44 @@ class CurseForgeDownloader:
     versions_list: List[str]
     excluded_versions_list: List[str]
     release_types_list: List[FileReleaseType]
-
-    cache_games: Dict[str, int]  # slug, id
-    cache_categories: Dict[str, int]  # slug, id
+    file_filter: FileFilter
+    workers: int
+    bulk_size: int
+    server_side_filter: bool
+    listing_ttl: float  # seconds
+    offline: bool
+    fingerprints: bool
+    buffer_size: int  # bytes
+    max_retries: int
+    max_downloads: int
+    bandwidth_limit: int  # bytes per second
+    request_missing_ids: bool  # ask for the IDs of unresolved mods in the console
+    max_searches: int  # per mod
+    search_size: int
+    unresolved_ttl: float  # seconds
+
+    input_lock: threading.Lock  # guards manual console input
+    page_executor: Optional[ThreadPoolExecutor]  # fetches the pages of file listings
+    scheduler: Optional[DownloadScheduler]  # runs the downloads of the plan being executed
+    store: Optional[JarStore]  # jars shared with other output folders, None to download into the folder directly
+
+    resolver: SharedResolver  # mods and file listings shared by every downloader of a batch
+    mod_jsons: Dict[int, json]  # id, mod json
+    manifest: Dict[int, Dict[str, Any]]  # id, file chosen by the previous run
+    incremental: bool
 
     mod_urls: List[str]  # url
-    mod_files: List[str]  # name
+    mod_infos: Dict[str, Optional[Dict[str, Any]]]  # url, info resolved before downloading (None if unchanged)
+    dependency_graph: Dict[int, List[int]]  # id, ids of the required dependencies of its latest file
+    catalog: OutputCatalog  # files in the output folder
+    local_mods: Dict[int, List[str]]  # id, names of the local files that fingerprinted as the mod
+    local_file_mods: Dict[str, int]  # name, id of the mod the local file fingerprinted as
+    unidentified_files: bool  # the output folder holds files that no fingerprint matched to a mod
 
     process_results: List[Tuple[str, str]]  # url, status
+    http_stats: Dict[str, float]  # of the process when the downloader was created, the summary prints the difference
+    cache_stats: Dict[str, float]
+    unresolved: List[Tuple[str, str]]  # url, reason, of the mods that were left for the report at the end
 
     #########################################################
     # FILE FUNCTIONS
@@ -68,35 +114,123 @@ class CurseForgeDownloader:
         return lines
 
     def __read_mods(self) -> List[str]:
-        return self.__read_file(self.mods_path)
-
-    def __get_file_datetime(self, file_path: str) -> datetime:
-        modified_time = os.path.getmtime(file_path)
-        return datetime.fromtimestamp(modified_time)
+        return [line for line in self.__read_file(self.mods_path) if len(line.strip()) != 0]
 
     def __get_file_size(self, file_path: str):
         return os.path.getsize(file_path)
 
-    def __compile_file_time_pairs(self, dir_path: str) -> List[str]:
-        result_list = []
-        out_path_list = os.listdir(dir_path)
-        for cur_name in out_path_list:
-            result_list.append(cur_name)
-        return result_list
+    def __create_hasher(self, file_hash: Optional[Tuple[HashAlgo, str]]):
+        if file_hash is None:
+            return None
+        return hashlib.sha1() if file_hash[0] == HashAlgo.SHA1 else hashlib.md5()
+
+    def __resume_hasher(self, file_hash: Optional[Tuple[HashAlgo, str]], temp_path: str):
+        # A partial file left by a previous run is hashed once, everything after it is hashed while streaming
+        hasher = self.__create_hasher(file_hash)
+        if hasher is None or not os.path.exists(temp_path):
+            return hasher
+        with open(temp_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(self.buffer_size), b''):
+                hasher.update(chunk)
+        return hasher
+
+    def __verify_download(self, temp_path: str, hasher, file_hash: Optional[Tuple[HashAlgo, str]],
+                          file_length: Optional[int]) -> bool:
+        if file_length is not None and self.__get_file_size(temp_path) != file_length:
+            logger.log_severe('Downloaded file has the wrong size, {Expected: %s, Actual: %s, File: %s}' %
+                              (file_length, self.__get_file_size(temp_path), temp_path))
+            return False
+        if hasher is not None and hasher.hexdigest().lower() != file_hash[1].lower():
+            logger.log_severe('Downloaded file failed %s verification, {Expected: %s, Actual: %s, File: %s}' %
+                              (file_hash[0].name, file_hash[1], hasher.hexdigest(), temp_path))
+            return False
+        return True
 
-    def __download_file(self, file_path: str, download_url: str) -> bool:
-        max_attempts = 5
+    def __get_range_start(self, request) -> Optional[int]:
+        # Content-Range: bytes <start>-<end>/<length>
+        content_range = request.headers.get('Content-Range', '')
+        match = re.match(r'bytes\s+(\d+)-', content_range.strip())
+        return int(match.group(1)) if match is not None else None
+
+    def __download_file(self, file_path: str, download_url: str, file_hash: Optional[Tuple[HashAlgo, str]] = None,
+                        file_length: Optional[int] = None) -> bool:
+        temp_path = file_path + DOWNLOAD_SUFFIX
+        hasher = self.__resume_hasher(file_hash, temp_path)
+        downloaded = self.__get_file_size(temp_path) if os.path.exists(temp_path) else 0
+        max_attempts = self.max_retries
+        request = None
         for attempt in range(max_attempts):
-            request = requests.get(download_url, stream=True)
-            if request.status_code != 200:
+            if attempt != 0:
+                curseforge_http.backoff(attempt, request)
+            headers = {'Range': 'bytes=%s-' % downloaded} if downloaded != 0 else None
+            try:
+                request = curseforge_http.download(download_url, headers)
+            except curseforge_http.RequestException as e:
+                logger.log_severe('Unable to connect to download URL, {Try: %s/%s, Error: %s, URL: %s}' %
+                                  (attempt+1, max_attempts, e, download_url))
+                request = None
+                continue
+            if request.status_code == 416:
+                request.close()
+                # The range starts at the end of the file when a previous run got every byte but did not finish
+                if downloaded != 0 and (file_length is not None or hasher is not None) and \
+                        self.__verify_download(temp_path, hasher, file_hash, file_length):
+                    os.replace(temp_path, file_path)
+                    return True
+                # Otherwise the partial file does not belong to this file and the download starts over
+                downloaded = 0
+                hasher = self.__create_hasher(file_hash)
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                continue
+            if request.status_code == 200:
+                # The server ignored the range, so the download starts over
+                if downloaded != 0:
+                    downloaded = 0
+                    hasher = self.__create_hasher(file_hash)
+            elif request.status_code == 206:
+                # A range that does not start at the end of the partial file would corrupt it when appended
+                range_start = self.__get_range_start(request)
+                if range_start != downloaded:
+                    logger.log_warning('Download resumed at byte %s instead of %s, starting over, {URL: %s}' %
+                                       (range_start, downloaded, download_url))
+                    request.close()
+                    downloaded = 0
+                    hasher = self.__create_hasher(file_hash)
+                    if os.path.exists(temp_path):
+                        os.remove(temp_path)
+                    continue
+            else:
                 logger.log_severe('Unable to access download URL, {Try: %s/%s, Code: %s, URL: %s}' %
                                   (attempt+1, max_attempts, request.status_code, download_url))
-                return False
-            file = open(file_path, 'wb')
-            for chunk in request.iter_content(chunk_size=8192):
-                file.write(chunk)
-            file.close()
-            request.close()
+                request.close()
+                if not curseforge_http.is_retryable(request):
+                    return False
+                continue
+
+            file = open(temp_path, 'ab' if downloaded != 0 else 'wb')
+            try:
+                for chunk in request.iter_content(chunk_size=self.buffer_size):
+                    if self.scheduler is not None:
+                        self.scheduler.transferred(len(chunk))
+                    file.write(chunk)
+                    downloaded += len(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+            except curseforge_http.RequestException as e:
+                logger.log_severe('Download interrupted, resuming at byte %s, {Try: %s/%s, Error: %s, URL: %s}' %
+                                  (downloaded, attempt+1, max_attempts, e, download_url))
+                continue
+            finally:
+                file.close()
+                request.close()
+
+            if not self.__verify_download(temp_path, hasher, file_hash, file_length):
+                os.remove(temp_path)
+                downloaded = 0
+                hasher = self.__create_hasher(file_hash)
+                continue
+            os.replace(temp_path, file_path)
             return True
         return False
 
@@ -109,9 +243,10 @@ class CurseForgeDownloader:
         file.write(data)
         file.close()
 
-    def __add_mod_to_file(self, mod_url: str):
-        logger.log_warning('Adding missing dependency to mods list: %s' % mod_url)
-        self.__write_append_file(self.mods_path, '\n' + mod_url)
+    def __add_mods_to_file(self, mod_urls: List[str]):
+        for mod_url in mod_urls:
+            logger.log_warning('Adding missing dependency to mods list: %s' % mod_url)
+        self.__write_append_file(self.mods_path, ''.join('\n' + mod_url for mod_url in mod_urls))
 
     #########################################################
     # CONSTRUCTOR FUNCTIONS
@@ -122,19 +257,69 @@ class CurseForgeDownloader:
                  output_folder_path: str,
                  versions_list: List[str],
                  excluded_versions_list: List[str],
-                 release_types_list: List[FileReleaseType]):
+                 release_types_list: List[FileReleaseType],
+                 *,
+                 workers: int = 1,
+                 bulk_size: int = 50,
+                 server_side_filter: bool = True,
+                 listing_ttl: float = 86400,
+                 offline: bool = False,
+                 fingerprints: bool = True,
+                 buffer_size: int = 1024 * 1024,
+                 max_retries: int = 5,
+                 max_downloads: int = 0,
+                 bandwidth_limit: int = 0,
+                 store_path: str = None,
+                 resolver: SharedResolver = None,
+                 request_missing_ids: bool = True,
+                 max_searches: int = 10,
+                 search_size: int = SEARCH_PAGE_SIZE,
+                 unresolved_ttl: float = 7 * 86400):
         logger.log_info('Initializing CurseForge Downloader...')
         self.mods_path = mods_file_path
         self.output_path = output_folder_path
-        self.__init_output_path()
         self.versions_list = versions_list
         self.excluded_versions_list = excluded_versions_list
         self.release_types_list = release_types_list
-        self.cache_games = dict()
-        self.cache_categories = dict()
+        self.file_filter = FileFilter(versions_list, excluded_versions_list, release_types_list)
+        self.workers = max(1, workers)
+        self.bulk_size = max(1, bulk_size)
+        self.server_side_filter = server_side_filter
+        self.listing_ttl = listing_ttl
+        self.offline = offline
+        self.fingerprints = fingerprints
+        self.buffer_size = max(8192, buffer_size)
+        self.max_retries = max(1, max_retries)
+        # Without a separate limit there are as many downloads at once as workers
+        self.max_downloads = max_downloads if max_downloads > 0 else self.workers
+        self.bandwidth_limit = max(0, bandwidth_limit)
+        # Without a console to answer, an unattended run would wait for the ID forever
+        self.request_missing_ids = request_missing_ids and sys.stdin is not None and sys.stdin.isatty()
+        if request_missing_ids and not self.request_missing_ids:
+            logger.log_info('No console to request missing IDs from, unresolved mods are reported at the end')
+        self.max_searches = max(1, max_searches)
+        self.search_size = min(SEARCH_PAGE_SIZE, max(1, search_size))
+        self.unresolved_ttl = unresolved_ttl
+        self.scheduler = None
+        self.store = JarStore(store_path, DOWNLOAD_SUFFIX) if store_path is not None else None
+        self.page_executor = None
+        self.input_lock = threading.Lock()
+        self.resolver = resolver if resolver is not None else SharedResolver()
+        self.mod_jsons = self.resolver.mod_jsons
+        self.manifest = dict()
+        self.incremental = False
         self.process_results = list()
+        self.http_stats = curseforge_http.get_stats()
+        self.cache_stats = curseforge_cache.get_stats()
+        self.unresolved = list()
         self.mod_urls = self.__read_mods()
-        self.mod_files = self.__compile_file_time_pairs(self.output_path)
+        self.mod_infos = dict()
+        self.dependency_graph = dict()
+        with curseforge_metrics.phase('catalog_scan'):
+            self.catalog = OutputCatalog(self.output_path, DOWNLOAD_SUFFIX)
+        self.local_mods = dict()
+        self.local_file_mods = dict()
+        self.unidentified_files = False
         logger.log_info('Successfully initialized CurseForge Downloader.')
 
     #########################################################
@@ -175,34 +360,13 @@ class CurseForgeDownloader:
     def __trim_url(self, url: str):
         return url.replace('https://', '').strip()
 
-    def __version_compat(self, file_json: json, releases: List[FileReleaseType]) -> bool:
-        if 'gameVersions' not in file_json:
-            return False
-        if 'releaseType' not in file_json:
-            return False
-        file_status = file_json['releaseType']
-        release_type = FileReleaseType(file_status)
-        if release_type not in releases:
-            return False
-
-        game_versions = file_json['gameVersions']
-        result = False
-        for game_version in game_versions:
-            if game_version in self.versions_list:
-                result = True
-            elif game_version in self.excluded_versions_list:
-                result = False
-                break
-        return result
-
     def __strip_str(self, string: str) -> str:
-        return string.lower().replace(' ', '').replace('-', '').replace('.', '')
+        return normalize_name(string)
 
-    def __get_list_values(self, input_json: json, find_value: str) -> List[str]:
-        output_list = list()
-        for cur_json in input_json:
-            output_list.append(cur_json[find_value])
-        return output_list
+    def __get_filter_key(self) -> str:
+        # A manifest entry is only valid for the filters that chose its file
+        return '%s|%s|%s' % (','.join(self.versions_list), ','.join(self.excluded_versions_list),
+                             ','.join(str(release_type.value) for release_type in self.release_types_list))
 
     def __get_time_difference(self, time1: datetime, time2: datetime) -> Tuple[int, int]:
         time_difference = (time2 - time1)
@@ -215,27 +379,53 @@ class CurseForgeDownloader:
     # QUERY FUNCTIONS
     #########################################################
 
-    def __query(self, api: str, args: str, params=None) -> json:
-        max_attempts = 5
+    def __query(self, api: str, args: str, params=None, body=None) -> json:
+        if self.offline:
+            logger.log_info('Skipping query while offline: %s' % (api % args))
+            return None
+        max_attempts = self.max_retries
+        api_request = None
         for attempt in range(max_attempts):
+            if attempt != 0:
+                curseforge_http.backoff(attempt, api_request)
             if params is None:
                 params = {}
             api_line = api % args
-            api_request = requests.get(api_line, params=params, headers=HEADERS)
+            try:
+                if body is None:
+                    api_request = curseforge_http.get_api(api_line, params)
+                else:
+                    api_request = curseforge_http.post_api(api_line, body)
+            except curseforge_http.RequestException as e:
+                # Attempts that are retried are expected under throttling, only the last one is an error
+                log = logger.log_severe if attempt + 1 == max_attempts else logger.log_info
+                log('Unable to connect to API, {Try: %s/%s, Error: %s, URL: %s, Parameters: %s}' %
+                    (attempt+1, max_attempts, e, api_line, params))
+                api_request = None
+                continue
             if api_request.status_code == 200:
-                api_json = api_request.json()
-                logger.log_info('Query successfully completed')
+                api_json = curseforge_http.read_json(api_request)
+                logger.log_debug('Query successfully completed')
                 api_request.close()
                 return api_json
-            logger.log_severe('Unable to parse json for API request, {Try: %s/%s, Code: %s, URL: %s, Parameters: %s}' %
-                              (attempt+1, max_attempts, api_request.status_code, api_line, params))
+            retried = attempt + 1 != max_attempts and curseforge_http.is_retryable(api_request)
+            log = logger.log_info if retried else logger.log_severe
+            log('Unable to parse json for API request, {Try: %s/%s, Code: %s, URL: %s, Parameters: %s}' %
+                (attempt+1, max_attempts, api_request.status_code, api_line, params))
             api_request.close()
+            if not retried:
+                break
         logger.log_info('Query failed')
+        return None
 
     def __query_api(self, args: str, params=None) -> json:
         logger.log_info('Querying Eternal API: %s' % args)
         return self.__query(CURSEFORGE_API, args, params)
 
+    def __query_api_post(self, args: str, body) -> json:
+        logger.log_info('Querying Eternal API: POST %s' % args)
+        return self.__query(CURSEFORGE_API, args, body=body)
+
     def __retrieve_json_section(self, json_list: json, search: Dict[str, str]):
         for sub_json in json_list:
             flag = True
@@ -253,6 +443,9 @@ class CurseForgeDownloader:
 
     def __query_game(self, game_slug: str) -> json:
         query = self.__query_api('games')
+        if query is None:
+            logger.log_severe('Unable to retrieve games from API')
+            return None
         section = self.__retrieve_json_section(query['data'], {
             'slug': game_slug
         })
@@ -263,25 +456,26 @@ class CurseForgeDownloader:
 
     def __query_game_id(self, info: Dict[str, Any]) -> int:
         game_slug = info['game_slug']
-        if game_slug in self.cache_games:
-            return self.cache_games[game_slug]
         cache_value = curseforge_cache.get_game_id(game_slug)
         if cache_value is not None:
-            self.cache_games[game_slug] = cache_value
             return cache_value
         game_json = self.__query_game(game_slug)
+        if game_json is None:
+            return -1
         if 'id' not in game_json:
             logger.log_warning('Unable to read API \"id\" value for game: %s' % game_slug)
             return -1
         game_id = game_json['id']
         game_name = game_json['name']
         curseforge_cache.add_game(game_id, game_slug, game_name)
-        self.cache_games[game_slug] = game_id
         logger.log_info('Retrieved game ID via Eternal: %s' % game_id)
         return game_id
 
     def __query_category(self, category_slug: str, game_id: int) -> json:
         query = self.__query_api('categories', {'gameId': game_id})
+        if query is None:
+            logger.log_severe('Unable to retrieve categories from API')
+            return None
         section = self.__retrieve_json_section(query['data'], {
             'slug': category_slug,
             'gameId': game_id
@@ -294,48 +488,114 @@ class CurseForgeDownloader:
     def __query_category_id(self, info: Dict[str, Any]) -> int:
         category_slug = info['category_slug']
         game_id = info['game_id']
-        if category_slug in self.cache_categories:
-            return self.cache_categories[category_slug]
         cache_value = curseforge_cache.get_category_id(category_slug)
         if cache_value is not None:
-            self.cache_categories[category_slug] = cache_value
             return cache_value
         category_json = self.__query_category(category_slug, game_id)
+        if category_json is None:
+            return -1
         if 'id' not in category_json:
             logger.log_warning('Unable to read API \"id\" value for category: %s' % category_slug)
             return -1
         category_id = category_json['id']
         category_name = category_json['name']
         curseforge_cache.add_category(category_id, category_slug, category_name)
-        self.cache_categories[category_slug] = category_id
         logger.log_info('Retrieved category ID via Eternal: %s' % category_id)
         return category_id
 
-    def __query_mod_search(self, info: Dict[str, Any]):
+    def __get_slug_variants(self, mod_slug: str) -> List[str]:
+        # The slug, the slug without suffixes like a mod loader or a version, and the slug without dashes.
+        # A mod that was renamed often still has one of them as its slug.
+        variants = [mod_slug, SLUG_SUFFIX_PATTERN.sub('', mod_slug), mod_slug.replace('-', '')]
+        return list(dict.fromkeys(variant for variant in variants if len(variant) != 0))
+
+    def __get_search_queries(self, info: Dict[str, Any]):
+        # The exact slug in its class, then in every class in case the mod was moved, then the pages of a full text
+        # search of each variant of the slug. A slug filter only returns the few mods with that slug, the first page
+        # of a text search has the configured size and the pages after it the largest size, to reach further down.
         game_id = info['game_id']
         category_id = info['category_id']
         mod_slug = info['mod_slug']
-        mod_json = self.__query_api('mods/search', {
-            'gameId': game_id,
-            'classId': category_id,
-            'slug': mod_slug,
-            'pageSize': 50,
-            'index': 0
-        })
-        if mod_json is None:
-            return
-        for sub_json in mod_json['data']:
-            if 'slug' in sub_json and sub_json['slug'] == mod_slug:
-                return sub_json
-        return None
+        slug_size = min(SLUG_SEARCH_SIZE, self.search_size)
+        yield {'gameId': game_id, 'classId': category_id, 'slug': mod_slug, 'pageSize': slug_size, 'index': 0}
+        yield {'gameId': game_id, 'slug': mod_slug, 'pageSize': slug_size, 'index': 0}
+        for variant in self.__get_slug_variants(mod_slug):
+            index = 0
+            page_size = self.search_size
+            while index + page_size <= SEARCH_MAX_INDEX:
+                yield {'gameId': game_id, 'classId': category_id, 'searchFilter': variant.replace('-', ' '),
+                       'pageSize': page_size, 'index': index}
+                index += page_size
+                page_size = SEARCH_PAGE_SIZE
+
+    def __query_mod_search(self, info: Dict[str, Any]) -> Tuple[Optional[json], str]:
+        # Returns the mod JSON, or None and the reason why no search found it
+        mod_slug = info['mod_slug']
+        variants = set(self.__get_slug_variants(mod_slug)) - {mod_slug}
+        candidate = None  # a mod with a variant of the slug, it may be a different mod and is only reported
+        searches = 0
+        failed = 0
+        last_filter = None
+        for params in self.__get_search_queries(info):
+            search_filter = params.get('searchFilter')
+            if search_filter is not None and search_filter == last_filter:
+                continue
+            if searches == self.max_searches:
+                break
+            searches += 1
+            mod_json = self.__query_api('mods/search', params)
+            if mod_json is None:
+                failed += 1
+                continue
+            for sub_json in mod_json['data']:
+                if 'slug' not in sub_json:
+                    continue
+                if sub_json['slug'] == mod_slug:
+                    return sub_json, ''
+                if candidate is None and sub_json['slug'] in variants and 'id' in sub_json:
+                    candidate = sub_json
+            # The remaining pages of a full text search are skipped once a page is not full
+            last_filter = search_filter if len(mod_json['data']) < params['pageSize'] else None
+        if failed == searches:
+            return None, SEARCH_FAILED_REASON
+        if candidate is not None:
+            return None, 'not found by %s searches, possibly renamed to "%s" (ID %s)' % \
+                (searches, candidate['slug'], candidate['id'])
+        return None, 'not found by %s searches' % searches
 
     def __query_mod_json(self, mod_id: int) -> json:
+        if mod_id in self.mod_jsons:
+            return self.mod_jsons[mod_id]
         result = self.__query_api('mods/%s' % str(mod_id))
         if result is None:
             logger.log_severe('Unable to retrieve mod of ID from API: %s' % mod_id)
             return None
+        self.mod_jsons[mod_id] = result['data']
         return result['data']
 
+    def __query_mod_jsons(self, mod_ids: List[int]) -> Dict[int, json]:
+        missing_ids = sorted(set(mod_id for mod_id in mod_ids if mod_id not in self.mod_jsons))
+        for index in range(0, len(missing_ids), self.bulk_size):
+            chunk = missing_ids[index:index + self.bulk_size]
+            result = self.__query_api_post('mods', {'modIds': chunk, 'filterPcOnly': True})
+            if result is None:
+                continue
+            rows = []
+            for mod_json in result['data']:
+                if 'id' not in mod_json or 'slug' not in mod_json:
+                    continue
+                self.mod_jsons[mod_json['id']] = mod_json
+                rows.append((mod_json['id'], mod_json['slug'], mod_json['name']))
+            curseforge_cache.add_mods(rows)
+
+        # Only mods the bulk request did not return are looked up one at a time
+        result = {}
+        for mod_id in mod_ids:
+            mod_json = self.__query_mod_json(mod_id)
+            if mod_json is not None:
+                result[mod_id] = mod_json
+        return result
+
     def __query_mod_manual(self, info: Dict[str, Any]) -> json:
         mod_json = None
         while True:
@@ -359,19 +619,40 @@ class CurseForgeDownloader:
 
     def __query_mod_id_retrieval(self, info: Dict[str, Any]) -> int:
         mod_slug = info['mod_slug']
-        result = self.__query_mod_search(info)
+        if self.offline:
+            logger.log_severe('Unable to retrieve mod ID while offline: %s' % mod_slug)
+            return -1
+        result = None
+        unresolved = curseforge_cache.get_unresolved(mod_slug)
+        if unresolved is not None and time.time() - unresolved['failed_at'] < self.unresolved_ttl:
+            # The searches for a dead or renamed slug are not repeated every run
+            reason = unresolved['reason']
+            logger.log_info('Skipping search of unresolved mod: %s (%s)' % (mod_slug, reason))
+        else:
+            result, reason = self.__query_mod_search(info)
+            if result is None and reason != SEARCH_FAILED_REASON:
+                curseforge_cache.set_unresolved(mod_slug, reason, time.time())
         if result is not None:
             logger.log_info("Mod information retrieved via Eternal API: %s" % mod_slug)
-        if result is None:
-            print('Unable to get mod \"%s\" through URL provided, please paste the ID of the mod from the mod URL: %s' %
-                  (info['mod_slug'], info['url']))
-            result = self.__query_mod_manual(info)
+            # The search result is the full mod JSON, keep it so it is not queried a second time
+            if 'id' in result:
+                self.mod_jsons[result['id']] = result
+        if result is None and self.request_missing_ids:
+            with self.input_lock:
+                logger.flush()
+                print('Unable to get mod \"%s\" through URL provided (%s), please paste the ID of the mod from the mod URL: '
+                      '%s' % (info['mod_slug'], reason, info['url']))
+                result = self.__query_mod_manual(info)
             if result is not None:
                 logger.log_info("Mod information retrieved via manual user input: %s" % mod_slug)
+        elif result is None:
+            self.unresolved.append((info['url'], reason))
 
-        if 'id' not in result:
+        if result is None or 'id' not in result:
             logger.log_severe('Unable to retrieve mod ID; attempted all available methods: %s' % mod_slug)
             return -1
+        if unresolved is not None or len(reason) != 0:
+            curseforge_cache.remove_unresolved(mod_slug)
         return result['id']
 
     def __query_mod_id(self, info: Dict[str, Any]) -> int:
@@ -401,23 +682,176 @@ class CurseForgeDownloader:
             curseforge_cache.add_mod(mod_id, mod_slug, mod_name)
         return mod_id
 
-    def __query_mod_files(self, info: Dict[str, Any]) -> json:
+    def __needs_full_listing(self, info: Dict[str, Any]) -> bool:
+        # A listing filtered by version misses the files of other versions. An older jar of a mod that was not
+        # identified by fingerprint can only be recognized, and removed, by the full listing of the mod.
+        if self.offline or info['mod_id'] in self.local_mods:
+            return False
+        return self.unidentified_files
+
+    def __get_files_filters(self, info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if not self.server_side_filter or self.__needs_full_listing(info):
+            return [{}]
+        # Versions that name a mod loader are sent as modLoaderType, every other version gets its own listing
+        loader_types = {loader_type.name.replace('_', '').lower(): loader_type for loader_type in ModLoaderType}
+        loaders = []
+        game_versions = []
+        for version in self.versions_list:
+            loader_type = loader_types.get(self.__strip_str(version))
+            if loader_type is not None:
+                loaders.append(loader_type)
+            else:
+                game_versions.append(version)
+        filters = [{'gameVersion': game_version} for game_version in game_versions]
+        if len(filters) == 0:
+            filters = [{}]
+        if len(loaders) == 1:
+            for cur_filter in filters:
+                cur_filter['modLoaderType'] = loaders[0].value
+        return filters
+
+    def __query_mod_files_page(self, info: Dict[str, Any], files_filter: Dict[str, Any], index: int) -> json:
+        # Another mods list of the batch may have queried the same page with a filter of the same version
+        page = self.resolver.get_page(info['mod_id'], files_filter, index)
+        if page is not None:
+            return page
+        params = dict(files_filter)
+        params.update({'index': index, 'pageSize': FILES_PAGE_SIZE})
+        page = self.__query_api('mods/%s/files' % info['mod_id'], params)
+        if page is None:
+            return None
+        page = {'data': tuple(FileRecord(file_json) for file_json in page['data']),
+                'pagination': page.get('pagination', {})}
+        self.resolver.put_page(info['mod_id'], files_filter, index, page)
+        return page
+
+    def __map_pages(self, function, args_list: List[Tuple]) -> List[json]:
+        if self.page_executor is None or len(args_list) <= 1:
+            return [function(*args) for args in args_list]
+        return list(self.page_executor.map(lambda args: function(*args), args_list))
+
+    def __is_date_sorted(self, records: List[FileRecord]) -> bool:
+        for index in range(1, len(records)):
+            if records[index - 1].timestamp < records[index].timestamp:
+                return False
+        return True
+
+    def __can_stop_paging(self, info: Dict[str, Any], records: List[FileRecord],
+                          truncated_pages: List[Tuple[FileRecord, ...]] = ()) -> bool:
+        # The newest file of the preferred release type is the first compatible one in date-sorted results.
+        # Paging can stop if that file is already downloaded and no older file of the mod is in the output folder.
+        latest_file = self.file_filter.first_preferred(records)
+        if latest_file is None or latest_file.file_name not in self.catalog:
+            return False
+        # The next pages of a listing are older than its first page. If that page ends after the latest file,
+        # the next pages can still hold a newer one.
+        for page_records in truncated_pages:
+            if len(page_records) == 0 or page_records[-1].timestamp > latest_file.timestamp:
+                return False
+        if info['mod_id'] in self.local_mods:
+            return self.local_mods[info['mod_id']] == [latest_file.file_name]
+        existing_files = self.__filter_by_common_name(records)
+        return existing_files == [latest_file.file_name]
+
+    def __query_mod_files(self, info: Dict[str, Any]) -> Optional[List[FileRecord]]:
+        filters = self.__get_files_filters(info)
+        first_pages = self.__map_pages(self.__query_mod_files_page, [(info, cur_filter, 0) for cur_filter in filters])
+        if None in first_pages:
+            logger.log_severe('Unable to retrieve mod files')
+            return None
+
         result = []
-        for i in range(0, 10000, 50):
-            cur_result = self.__query_api('mods/%s/files' % info['mod_id'], {'index': i})
-            if len(cur_result['data']) == 0:
-                break
-            result.extend(cur_result['data'])
-        if len(result) == 0:
+        remaining_pages = []
+        truncated_pages = []  # the first pages of the listings that have more pages
+        sorted_pages = True
+        for cur_filter, page in zip(filters, first_pages):
+            result.extend(page['data'])
+            sorted_pages = sorted_pages and self.__is_date_sorted(page['data'])
+            total_count = min(page.get('pagination', {}).get('totalCount', 0), FILES_MAX_INDEX)
+            if total_count > FILES_PAGE_SIZE:
+                truncated_pages.append(page['data'])
+            for index in range(FILES_PAGE_SIZE, total_count, FILES_PAGE_SIZE):
+                remaining_pages.append((info, cur_filter, index))
+
+        if len(remaining_pages) != 0 and sorted_pages:
+            result.sort(key=lambda record: record.timestamp, reverse=True)
+            if self.__can_stop_paging(info, result, truncated_pages):
+                logger.log_info('Skipping %s pages of files, the latest file is already downloaded: %s' %
+                                (len(remaining_pages), info['mod_slug']))
+                remaining_pages = []
+                info.update({'files_complete': False})
+
+        for page in self.__map_pages(self.__query_mod_files_page, remaining_pages):
+            if page is None:
+                logger.log_severe('Unable to retrieve mod files')
+                return None
+            result.extend(page['data'])
+
+        # Files that match several game versions are returned by each of their listings
+        file_ids = set()
+        records = []
+        for record in result:
+            if record.id in file_ids:
+                continue
+            file_ids.add(record.id)
+            records.append(record)
+        if len(records) == 0:
             logger.log_severe('Unable to retrieve mod files')
-        return result
+        return records
+
+    def __get_listing_key(self, info: Dict[str, Any]) -> str:
+        return json.dumps(self.__get_files_filters(info), sort_keys=True)
+
+    def __is_listing_valid(self, info: Dict[str, Any], listing: Dict[str, Any]) -> bool:
+        if not listing['complete'] and not self.__can_stop_paging(info, listing['files']):
+            return False
+        if self.offline:
+            return True
+        mod_json = self.mod_jsons.get(info['mod_id'])
+        # A mod JSON that was already queried this run tells for free whether the mod changed
+        if mod_json is not None and listing['date_modified'] is not None:
+            if mod_json.get('dateModified') != listing['date_modified']:
+                return False
+        if time.time() - listing['fetched_at'] < self.listing_ttl:
+            return True
+
+        # Expired listings are revalidated against the mod instead of being queried again
+        mod_json = self.__query_mod_json(info['mod_id'])
+        if mod_json is None:
+            return False
+        if listing['date_modified'] is not None:
+            unchanged = mod_json.get('dateModified') == listing['date_modified']
+        else:
+            unchanged = mod_json.get('mainFileId') == listing['latest_file_id']
+        if unchanged:
+            curseforge_cache.touch_listing(info['mod_id'], self.__get_listing_key(info), time.time())
+        return unchanged
+
+    def __get_mod_files(self, info: Dict[str, Any]) -> Optional[List[FileRecord]]:
+        listing = curseforge_cache.get_listing(info['mod_id'], self.__get_listing_key(info))
+        if listing is not None:
+            listing['files'] = [FileRecord(file_json) for file_json in listing['files']]
+        if listing is not None and self.__is_listing_valid(info, listing):
+            logger.log_info('Retrieved files of mod \"%s\" via cache' % info['mod_slug'])
+            return listing['files']
+        if self.offline:
+            logger.log_severe('No cached files of mod \"%s\" are available while offline' % info['mod_slug'])
+            return None
+
+        fetched_at = time.time()
+        records = self.__query_mod_files(info)
+        if records is None or len(records) == 0:
+            return records
+        mod_json = self.mod_jsons.get(info['mod_id'], {})
+        curseforge_cache.set_listing(info['mod_id'], self.__get_listing_key(info), fetched_at,
+                                     mod_json.get('dateModified'), mod_json.get('mainFileId'),
+                                     info.get('files_complete', True), [record.to_json() for record in records])
+        return records
 
     def __query_mod_name(self, info) -> str:
         return curseforge_cache.get_mod_name(info['mod_slug'])
 
-    def __query_dependency_slug(self, info: Dict[str, Any], dependency_json: json) -> str:
-        dependency_id = dependency_json['modId']
-
+    def __query_dependency_slug(self, info: Dict[str, Any], dependency_id: int) -> str:
         mod_slug = curseforge_cache.get_mod_slug(dependency_id)
         if mod_slug is None:
             dependency_json = self.__query_mod_json(dependency_id)
@@ -433,40 +867,17 @@ class CurseForgeDownloader:
     # INTERMEDIARY FUNCTIONS
     #########################################################
 
-    def __get_latest_file(self, info: Dict[str, Any], releases: List[FileReleaseType]) -> json:
-        files_json = info['files_json']
-        latest = datetime.min
-        latest_json = None
-        for cur_json in files_json:
-            if not self.__version_compat(cur_json, releases[0:1]):
-                continue
-            if 'fileDate' not in cur_json:
-                continue
-            file_date = self.__get_datetime(cur_json['fileDate'])
-            if file_date > latest:
-                latest = file_date
-                latest_json = cur_json
-
-        # If there are no non-release type specific files, check for all release types
-        if len(releases) != 0 and latest_json is None:
-            return self.__get_latest_file(info, releases[1:])
+    def __get_latest_file(self, info: Dict[str, Any]) -> Optional[FileRecord]:
+        return self.file_filter.select_latest(info['files'], info['compatible'])
 
-        return latest_json
+    def __filter_files(self, records: List[FileRecord]) -> array:
+        return self.file_filter.filter(records)
 
-    def __filter_files_json(self, info: Dict[str, Any], files_json: json) -> json:
-        new_json = []
-        for cur_json in files_json:
-            if not self.__version_compat(cur_json, self.release_types_list):
-                continue
-            new_json.append(cur_json)
-        return new_json
-
-    def __get_common_name(self, info: Dict[str, Any]) -> str:
-        # Use unfiltered files json just in case user has mod of different version installed
-        file_names = info['unfiltered_file_names']
-        common_name = self.__strip_str(file_names[0])
-        for cur_name in file_names:
-            cur_name = self.__strip_str(cur_name)
+    def __get_common_name(self, records: List[FileRecord]) -> str:
+        # Use all files just in case user has mod of different version installed
+        common_name = self.__strip_str(records[0].file_name)
+        for record in records:
+            cur_name = self.__strip_str(record.file_name)
             new_common = ''
             for index in range(len(cur_name)):
                 char_cur = cur_name[index]
@@ -480,47 +891,41 @@ class CurseForgeDownloader:
             common_name = new_common
         return common_name
 
-    def __filter_by_common_name(self, info: Dict[str, Any]) -> List[str]:
-        files_list = list()
-        common_name = self.__get_common_name(info)
+    def __filter_by_common_name(self, records: List[FileRecord]) -> List[str]:
+        common_name = self.__get_common_name(records)
         if len(common_name) == 0:
-            return self.mod_files
-
-        # sort with common name
-        for file_name in self.mod_files:
-            stripped_name = self.__strip_str(file_name)
-            if not stripped_name.startswith(common_name):
-                continue
-            files_list.append(file_name)
-        return files_list
+            return self.catalog.names()
+        return self.catalog.find_prefix(common_name)
 
-    def __filter_by_compare_name(self, info: Dict[str, Any], files_list: List[str]) -> List[str]:
-        file_names = info['unfiltered_file_names']
-        new_names = list()
-        for file_name in files_list:
-            if file_name in file_names:
-                new_names.append(file_name)
-        return new_names
+    def __filter_by_compare_name(self, records: List[FileRecord], files_list: List[str]) -> List[str]:
+        file_names = set(record.file_name for record in records)
+        return [file_name for file_name in files_list if file_name in file_names]
 
     def __get_filtered_files(self, info: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
-        files_list = self.__filter_by_common_name(info)
-        # even if one file is found be absolutely sure that it's an official mod file
-        files_list = self.__filter_by_compare_name(info, files_list)
+        files_list = self.local_mods.get(info['mod_id'])
+        if files_list is None:
+            files_list = self.__filter_by_common_name(info['files'])
+            # even if one file is found be absolutely sure that it's an official mod file
+            files_list = self.__filter_by_compare_name(info['files'], files_list)
+            # Jars that fingerprinted as a different mod never belong to this one
+            files_list = [file_name for file_name in files_list
+                          if self.local_file_mods.get(file_name, info['mod_id']) == info['mod_id']]
 
         files_dict = {}
         for file_name in files_list:
-            file_path = os.path.join(self.output_path, file_name)
-            file_time = self.__get_file_datetime(file_path)
-            file_size = self.__get_file_size(file_path)
+            if file_name not in self.catalog:
+                continue
+            file_time = self.catalog.get_datetime(file_name)
+            file_size = self.catalog.get_size(file_name)
             files_dict.update({file_name: {'time': file_time, 'size': file_size}})
         return files_dict
 
     def __check_name_overlap(self, info: Dict[str, Any]) -> bool:
-        files_json = info['files_json']
-        files_list = info['file_names']
+        records = info['files']
 
         test_set = set()
-        for file_name in files_list:
+        for index in info['compatible']:
+            file_name = records[index].file_name
             if file_name in test_set:
                 return True
             test_set.add(file_name)
@@ -528,14 +933,14 @@ class CurseForgeDownloader:
         return False
 
     def __check_needs_update_normal(self, info: Dict[str, Any]) -> bool:
-        latest_json = info['latest_json']
+        latest_file = info['latest_file']
         existing_files = info['existing_files']
-        latest_name = latest_json['fileName']
+        latest_name = latest_file.file_name
         existing_name = list(existing_files.keys())[0]
         return existing_name != latest_name
 
     def __check_needs_update_special(self, info: Dict[str, Any]) -> bool:
-        latest_json = info['latest_json']
+        latest_file = info['latest_file']
         existing_files = info['existing_files']
         existing_files: dict
         existing_tuple = list(existing_files.values())[0]
@@ -549,7 +954,7 @@ class CurseForgeDownloader:
         # Compare the file sizes, if sizes are different, expect outdated.
         # There is an extreme edge case here that both the current file and latest file have the exact same
         # file size but are different versions. This is fixable, but it would take even more iterating.
-        latest_size = latest_json['fileLength']
+        latest_size = latest_file.file_length
         existing_size = existing_tuple['size']
         return latest_size != existing_size
 
@@ -567,58 +972,113 @@ class CurseForgeDownloader:
             return self.__check_needs_update_special(info)
         return self.__check_needs_update_normal(info)
 
-    def __remove_old_files(self, info: Dict[str, Any]):
-        existing_files = info['existing_files']
-        for file_name in existing_files:
+    def __remove_old_files(self, mod_plan: ModPlan):
+        for file_name in mod_plan.files_to_remove:
+            if file_name not in self.catalog:
+                continue
             file_path = os.path.join(self.output_path, file_name)
             logger.log_info('Removing old file: %s' % file_name)
             os.remove(file_path)
+            self.catalog.remove(file_name)
+            if self.store is not None:
+                self.store.remove_ref(self.output_path, file_name)
+
+    def __download_stored_file(self, target: PlannedFile, file_hash: Optional[Tuple[HashAlgo, str]]) -> bool:
+        # A file that another output folder already downloaded is only linked into this one
+        blob = self.store.get_blob(target.file_id, target.hash)
+        if self.store.contains(blob, target.file_length):
+            logger.log_info('Found %s in the jar store' % target.file_name)
+        elif not self.__download_file(self.store.prepare(blob), target.download_url, file_hash, target.file_length):
+            return False
+        file_path = os.path.join(self.output_path, target.file_name)
+        method = self.store.link(blob, file_path, file_path + DOWNLOAD_SUFFIX)
+        self.store.add_ref(blob, self.output_path, target.file_name)
+        logger.log_info('Linked %s from the jar store (%s)' % (target.file_name, method))
+        return True
 
-    def __download_mod_file(self, info: Dict[str, Any]):
-        latest_json = info['latest_json']
-        file_name = latest_json['fileName']
-        download_url = latest_json['downloadUrl']
-        if download_url is None:
-            download_url = CURSEFORGE_FILES % (str(latest_json['id'])[:4], str(latest_json['id'])[4:], file_name)
-        logger.log_info('Starting download of mod: %s %s' % (info['mod_name'], file_name))
-        self.__download_file(os.path.join(self.output_path, file_name), download_url)
+    def __download_mod_file(self, mod_plan: ModPlan) -> bool:
+        target = mod_plan.target
+        file_hash = (HashAlgo(target.hash_algo), target.hash) if target.hash is not None else None
+        logger.log_info('Starting download of mod: %s %s' % (mod_plan.mod_name, target.file_name))
+        if self.store is not None:
+            success = self.__download_stored_file(target, file_hash)
+        else:
+            success = self.__download_file(os.path.join(self.output_path, target.file_name), target.download_url,
+                                           file_hash, target.file_length)
+        if not success:
+            logger.log_severe('Unable to download mod: %s %s' % (mod_plan.mod_name, target.file_name))
+            if self.scheduler is not None:
+                self.scheduler.skipped(mod_plan.bytes_to_fetch)
+            return False
+        self.catalog.add(target.file_name)
         logger.log_info('Download finished successfully')
+        return True
 
-    def __get_dependency_url(self, info: Dict[str, Any], dependency_slug: str) -> str:
-        return CURSEFORGE_LINK % (info['game_slug'], info['category_slug'], dependency_slug)
+    def __save_downloaded_fingerprint(self, mod_plan: ModPlan):
+        # The listing already carries the fingerprint, so a downloaded jar never has to be hashed
+        target = mod_plan.target
+        if target.fingerprint is None or target.file_name not in self.catalog:
+            return
+        curseforge_cache.set_fingerprint(self.output_path, target.file_name, self.catalog.get_size(target.file_name),
+                                         self.catalog.get_mtime(target.file_name), target.fingerprint,
+                                         mod_plan.mod_id, target.file_id)
 
-    def __check_dependencies(self, info: Dict[str, Any]):
-        latest_json = info['latest_json']
-        if 'dependencies' not in latest_json or len(latest_json['dependencies']) == 0:
-            logger.log_info('The mod \"%s\" has no dependencies that need to be downloaded' % info['mod_name'])
-            return True
-        dependencies_list = latest_json['dependencies']
-        for dependency in dependencies_list:
-            if 'modId' not in dependency or 'relationType' not in dependency:
-                logger.log_warning('Dependency for \"%s\" could not be read properly' % info['mod_name'])
-                continue
-            dependency_type = dependency['relationType']
-            if dependency_type != FileRelationType.REQUIRED_DEPENDENCY.value:
-                continue
-            dependency_slug = self.__query_dependency_slug(info, dependency)
-            if len(dependency_slug) == 0:
+    def __query_fingerprint_matches(self, fingerprints: List[int]) -> Dict[int, Tuple[int, int]]:
+        matches = {}
+        result = self.__query_api_post('fingerprints', {'fingerprints': fingerprints})
+        if result is None:
+            return matches
+        for match_json in result['data'].get('exactMatches', []):
+            file_json = match_json.get('file', {})
+            if 'fileFingerprint' not in file_json:
                 continue
-
-            dependency_url = self.__get_dependency_url(info, dependency_slug)
-            dependency_url_s = self.__trim_url(dependency_url)
-            found = False
-            for mod_url in self.mod_urls:
-                mod_url_s = self.__trim_url(mod_url)
-                if dependency_url_s == mod_url_s:
-                    found = True
-                    break
-            if found:
-                logger.log_info('Dependency \"%s\" for mod \"%s\" is already in the downloads list' %
-                                (dependency_slug, info['mod_name']))
+            matches[file_json['fileFingerprint']] = (match_json['id'], file_json['id'])
+        return matches
+
+    def __identify_local_files(self):
+        known = curseforge_cache.get_fingerprints(self.output_path)
+        fingerprints = {}  # name, fingerprint
+        matches = {}  # name, (mod id, file id)
+        file_names = self.catalog.names()
+        unhashed = []
+        for file_name in file_names:
+            entry = known.get(file_name)
+            if entry is None or entry['size'] != self.catalog.get_size(file_name) or \
+               entry['mtime'] != self.catalog.get_mtime(file_name):
+                unhashed.append(file_name)
                 continue
-            self.__add_mod_to_file(dependency_url)
-            self.mod_urls.append(dependency_url)
-
+            fingerprints[file_name] = entry['fingerprint']
+            if entry['mod_id'] is not None:
+                matches[file_name] = (entry['mod_id'], entry['file_id'])
+
+        if len(unhashed) != 0:
+            logger.log_info('Fingerprinting %s files in the output folder' % len(unhashed))
+            hashed = curseforge_fingerprint.fingerprint_files(
+                [os.path.join(self.output_path, file_name) for file_name in unhashed])
+            for file_name in unhashed:
+                fingerprints[file_name] = hashed[os.path.join(self.output_path, file_name)]
+
+        unmatched = [file_name for file_name in fingerprints if file_name not in matches]
+        if len(unmatched) != 0 and not self.offline:
+            fingerprint_matches = self.__query_fingerprint_matches(
+                sorted(set(fingerprints[file_name] for file_name in unmatched)))
+            for file_name in unmatched:
+                if fingerprints[file_name] in fingerprint_matches:
+                    matches[file_name] = fingerprint_matches[fingerprints[file_name]]
+
+        for file_name in unhashed + unmatched:
+            mod_id, file_id = matches.get(file_name, (None, None))
+            curseforge_cache.set_fingerprint(self.output_path, file_name, self.catalog.get_size(file_name),
+                                             self.catalog.get_mtime(file_name), fingerprints[file_name], mod_id,
+                                             file_id)
+        curseforge_cache.remove_fingerprints(self.output_path, [file_name for file_name in known
+                                                                if file_name not in self.catalog])
+
+        for file_name, (mod_id, file_id) in matches.items():
+            self.local_file_mods[file_name] = mod_id
+            self.local_mods.setdefault(mod_id, []).append(file_name)
+        logger.log_info('Identified %s of %s files in the output folder by fingerprint' %
+                        (len(matches), len(fingerprints)))
 
     def __get_mod_preinfo(self, url: str) -> Dict[str, Any]:
         url = self.__trim_url(url)
@@ -659,27 +1119,23 @@ class CurseForgeDownloader:
             return {}
         info.update({'mod_name': mod_name})
 
-        unfiltered_files_json = self.__query_mod_files(info)
-        if unfiltered_files_json is None:
+        start = time.perf_counter()
+        records = self.__get_mod_files(info)
+        curseforge_metrics.observe('mod_files', '', time.perf_counter() - start)
+        if records is None:
             return {}
-        info.update({'unfiltered_files_json': unfiltered_files_json})
-        files_json = self.__filter_files_json(info, unfiltered_files_json)
-        info.update({'files_json': files_json})
+        info.update({'files': records})
+        compatible = self.__filter_files(records)
+        info.update({'compatible': compatible})
 
-        latest_json = self.__get_latest_file(info, self.release_types_list)
-        if latest_json is None:
+        latest_file = self.__get_latest_file(info)
+        if latest_file is None:
             return {}
-        info.update({'latest_json': latest_json})
+        info.update({'latest_file': latest_file})
 
-        latest_datetime = self.__get_datetime(latest_json['fileDate'])
+        latest_datetime = self.__get_datetime(latest_file.file_date)
         info.update({'latest_datetime': latest_datetime})
 
-        unfiltered_file_names = self.__get_list_values(unfiltered_files_json, 'fileName')
-        info.update({'unfiltered_file_names': unfiltered_file_names})
-
-        file_names = self.__get_list_values(files_json, 'fileName')
-        info.update({'file_names': file_names})
-
         existing_files = self.__get_filtered_files(info)
         info.update({'existing_files': existing_files})
 
@@ -695,23 +1151,55 @@ class CurseForgeDownloader:
         logger.log_info('The mod \"%s\" has an update available.' % mod_name)
         return True
 
-    def __download_single(self, url: str) -> DownloadStatus:
-        info = self.__get_mod_info(url)
+    def __check_unchanged(self, url: str) -> bool:
+        info = self.__get_mod_preinfo(url)
         if len(info) == 0:
-            return self.DownloadStatus.ERROR
+            return False
+        mod_id = curseforge_cache.get_mod_id(info['mod_slug'])
+        if mod_id is None or mod_id not in self.manifest or mod_id not in self.mod_jsons:
+            return False
+        entry = self.manifest[mod_id]
+        if entry['filter'] != self.__get_filter_key():
+            return False
+        if entry['date_modified'] is None or entry['date_modified'] != self.mod_jsons[mod_id].get('dateModified'):
+            return False
+        if entry['file_name'] not in self.catalog or self.catalog.get_size(entry['file_name']) != entry['file_length']:
+            return False
+        logger.log_info('The mod \"%s\" has not changed since the last run' % info['mod_slug'])
+        return True
 
-        self.__check_dependencies(info)
+    def __save_manifest_entry(self, mod_plan: ModPlan):
+        target = mod_plan.target
+        curseforge_cache.set_manifest_entry(self.output_path, mod_plan.mod_id, target.file_id, target.file_name,
+                                            target.file_date, target.file_length, target.hash,
+                                            mod_plan.date_modified, self.__get_filter_key())
 
-        needs_update = self.__check_for_updates(info)
-        if not needs_update:
+    def __execute_single(self, mod_plan: ModPlan) -> DownloadStatus:
+        if mod_plan.action == PlanAction.ERROR:
+            return self.DownloadStatus.ERROR
+        if mod_plan.action == PlanAction.UNCHANGED:
+            return self.DownloadStatus.IGNORED
+        if mod_plan.action == PlanAction.UP_TO_DATE:
+            self.__save_manifest_entry(mod_plan)
             return self.DownloadStatus.IGNORED
 
-        self.__remove_old_files(info)
-        self.__download_mod_file(info)
+        if self.offline:
+            logger.log_warning('The mod \"%s\" was not updated to %s while offline' %
+                               (mod_plan.mod_name, mod_plan.target.file_name))
+            return self.DownloadStatus.IGNORED
+
+        # Old files are only removed once the new file is verified and in place
+        if not self.__download_mod_file(mod_plan):
+            return self.DownloadStatus.ERROR
+        self.__remove_old_files(mod_plan)
+        self.__save_downloaded_fingerprint(mod_plan)
+        self.__save_manifest_entry(mod_plan)
 
         return self.DownloadStatus.SUCCESS
 
     def __print_results(self, time_difference: Tuple[int, int]):
+        # The summary is printed directly, so every log record has to be written before it
+        logger.flush()
         total_success = 0
         total_counts = dict()
         for category in self.DownloadStatus:
@@ -726,18 +1214,8 @@ class CurseForgeDownloader:
                 total_success += 1
             print('%s: %s' % (result, mod_url.strip()))
 
-        print('\n---------------------------------')
-        print('Error log:')
-        errors_found = False
-        for entry in logger.history:
-            level = entry[0]
-            text = entry[1]
-            if level == logger.LogLevel.INFO:
-                continue
-            errors_found = True
-            print('%s: %s' % (level.value, text))
-        if not errors_found:
-            print('Script executed with no errors')
+        self.__print_error_log()
+        self.__print_unresolved()
 
         print('\n---------------------------------')
         print('Overview results:')
@@ -745,18 +1223,452 @@ class CurseForgeDownloader:
             print('%s: %s' % (category, count))
         print('Total successful: %s/%s' % (total_success, len(self.process_results)))
         print('Total time taken: %s minutes, %s seconds' % (time_difference[0], time_difference[1]))
+        if self.scheduler is not None:
+            print('Downloaded: %s KiB in %.1f seconds (%s KiB/s)' %
+                  (self.scheduler.bytes_done // 1024, self.scheduler.get_elapsed(),
+                   self.scheduler.get_throughput() // 1024))
+        self.__print_api_stats()
+        self.__print_phase_times()
+
+    def __print_plan(self, plan: Plan, time_difference: Tuple[int, int]):
+        logger.flush()
+        print('\n---------------------------------')
+        print('Planned changes:')
+        for mod_plan in plan.mods:
+            if mod_plan.action == PlanAction.UPDATE:
+                print('%s: %s %s -> %s (%s KiB)' % (mod_plan.action.value, mod_plan.mod_name,
+                                                    ', '.join(mod_plan.current_files), mod_plan.target.file_name,
+                                                    mod_plan.bytes_to_fetch // 1024))
+            elif mod_plan.action == PlanAction.DOWNLOAD:
+                print('%s: %s %s (%s KiB)' % (mod_plan.action.value, mod_plan.mod_name, mod_plan.target.file_name,
+                                              mod_plan.bytes_to_fetch // 1024))
+            else:
+                print('%s: %s' % (mod_plan.action.value, mod_plan.url.strip()))
+        for dependency_url in plan.dependencies_to_add:
+            print('Missing dependency: %s' % dependency_url)
+
+        self.__print_error_log()
+        self.__print_unresolved()
+
+        print('\n---------------------------------')
+        print('Overview of planned changes:')
+        for action in PlanAction:
+            print('%s: %s' % (action.value, plan.count(action)))
+        print('Missing dependencies: %s' % len(plan.dependencies_to_add))
+        print('Total to download: %s KiB' % (plan.bytes_to_fetch // 1024))
+        print('Total time taken: %s minutes, %s seconds' % (time_difference[0], time_difference[1]))
+        self.__print_api_stats()
+        self.__print_phase_times()
+
+    def __print_error_log(self):
+        print('\n---------------------------------')
+        print('Error log:')
+        errors = logger.get_errors()
+        for level, text in errors:
+            print('%s: %s' % (level.value, text))
+        if logger.dropped_errors != 0:
+            print('... and %s older warnings and errors' % logger.dropped_errors)
+        if len(errors) == 0:
+            print('Script executed with no errors')
+
+    def __print_unresolved(self):
+        # Mods that would have asked for their ID, all at once instead of one prompt each
+        if len(self.unresolved) == 0:
+            return
+        print('\n---------------------------------')
+        print('Unresolved mods:')
+        for mod_url, reason in sorted(self.unresolved):
+            print('%s: %s' % (reason, mod_url.strip()))
+        print('Fix the URLs of these mods or run with RequestMissingIDs to enter their IDs')
+
+    def __print_api_stats(self):
+        # Only what this downloader did, a batch runs several of them in one process
+        http_stats = {key: value - self.http_stats[key] for key, value in curseforge_http.get_stats().items()}
+        cache_stats = {key: value - self.cache_stats[key] for key, value in curseforge_cache.get_stats().items()}
+        lookups = cache_stats['cache_hits'] + cache_stats['cache_misses']
+        print('API data received: %s KiB (%s KiB saved by compression)' %
+              (int(http_stats['api_bytes_received']) // 1024,
+               max(0, int(http_stats['api_bytes_decoded'] - http_stats['api_bytes_received'])) // 1024))
+        print('Throttled requests: %s, rate limiter wait: %.1f seconds' %
+              (http_stats['throttled'], http_stats['limiter_wait_seconds']))
+        print('Circuit breaker trips: %s, circuit breaker wait: %.1f seconds' %
+              (http_stats['breaker_trips'], http_stats['breaker_wait_seconds']))
+        print('Cache hit ratio: %.1f%%' % (cache_stats['cache_hits'] / lookups * 100 if lookups != 0 else 0.0))
+
+    def __print_phase_times(self):
+        # Totals of the process, a batch of mods lists adds up the phases of every list
+        phase_times = ['%s %.2fs' % (name, seconds)
+                       for (name, label), seconds in list(curseforge_metrics.phases.items()) if len(label) == 0]
+        if len(phase_times) != 0:
+            print('Phase times: %s' % ', '.join(phase_times))
 
     #########################################################
-    # PUBLIC FUNCTIONS
+    # DEPENDENCY FUNCTIONS
     #########################################################
 
-    def download_all(self):
-        pre_time = datetime.now()
+    def __get_dependency_url(self, info: Dict[str, Any], dependency_slug: str) -> str:
+        return CURSEFORGE_LINK % (info['game_slug'], info['category_slug'], dependency_slug)
 
+    def __get_required_dependencies(self, info: Dict[str, Any]) -> List[int]:
+        dependency_ids = []
+        for mod_id, relation_type in info['latest_file'].dependencies:
+            if mod_id is None or relation_type is None:
+                logger.log_warning('Dependency for \"%s\" could not be read properly' % info['mod_name'])
+                continue
+            if relation_type == FileRelationType.REQUIRED_DEPENDENCY.value:
+                dependency_ids.append(mod_id)
+        return dependency_ids
+
+    def __prefetch_dependencies(self, dependency_ids: List[int]):
+        missing_ids = [dependency_id for dependency_id in set(dependency_ids)
+                       if curseforge_cache.get_mod_slug(dependency_id) is None]
+        if len(missing_ids) != 0:
+            self.__query_mod_jsons(missing_ids)
+
+    def __resolve_single(self, url: str) -> Optional[Dict[str, Any]]:
+        if self.incremental and self.__check_unchanged(url):
+            return None
+        try:
+            start = time.perf_counter()
+            info = self.__get_mod_info(url)
+            curseforge_metrics.observe('resolve_mod', '', time.perf_counter() - start)
+            return info
+        except Exception as e:
+            logger.log_severe('Unexpected error while resolving mod \"%s\": %s' % (url.strip(), e))
+            return {}
+
+    def __index_mod_ids(self) -> Dict[int, str]:
+        # Mods of the list with cached IDs are known before they are resolved, even if they are unchanged
+        mod_ids = {}
+        for mod_url in self.mod_urls:
+            preinfo = self.__get_mod_preinfo(mod_url)
+            if len(preinfo) == 0:
+                continue
+            mod_id = curseforge_cache.get_mod_id(preinfo['mod_slug'])
+            if mod_id is not None:
+                mod_ids.setdefault(mod_id, mod_url)
+        return mod_ids
+
+    def __expand_dependencies(self, resolved: List[Dict[str, Any]], mod_ids: Dict[int, str],
+                              known_urls: Set[str]) -> List[str]:
+        self.__prefetch_dependencies([dependency_id for info in resolved
+                                      for dependency_id in self.dependency_graph[info['mod_id']]
+                                      if dependency_id not in mod_ids])
+        new_urls = []
+        for info in resolved:
+            for dependency_id in self.dependency_graph[info['mod_id']]:
+                if dependency_id in mod_ids:
+                    continue
+                dependency_slug = self.__query_dependency_slug(info, dependency_id)
+                if len(dependency_slug) == 0:
+                    continue
+                dependency_url = self.__get_dependency_url(info, dependency_slug)
+                mod_ids[dependency_id] = dependency_url
+                dependency_url_s = self.__trim_url(dependency_url)
+                if dependency_url_s in known_urls:
+                    logger.log_info('Dependency \"%s\" for mod \"%s\" is already in the downloads list' %
+                                    (dependency_slug, info['mod_name']))
+                    continue
+                known_urls.add(dependency_url_s)
+                new_urls.append(dependency_url)
+        return new_urls
+
+    def __find_dependency_cycles(self) -> List[List[int]]:
+        cycles = []
+        state = {}  # id, True while the mod is on the current path and False once all its dependencies are done
+        for root_id in self.dependency_graph:
+            if root_id in state:
+                continue
+            path = [root_id]
+            children = [iter(self.dependency_graph[root_id])]
+            state[root_id] = True
+            while len(children) != 0:
+                child_id = next(children[-1], None)
+                if child_id is None:
+                    state[path.pop()] = False
+                    children.pop()
+                elif child_id not in state:
+                    path.append(child_id)
+                    children.append(iter(self.dependency_graph.get(child_id, [])))
+                    state[child_id] = True
+                elif state[child_id]:
+                    cycles.append(path[path.index(child_id):] + [child_id])
+        return cycles
+
+    def __resolve_dependencies(self) -> List[str]:
+        # Every mod is resolved before anything is downloaded. The required dependencies of a level are looked
+        # up together and become the next level, until no mod has a dependency that is not in the list yet.
+        mod_ids = self.__index_mod_ids()
+        known_urls = set(self.__trim_url(mod_url) for mod_url in self.mod_urls)
+        added_urls = []
+        level_urls = list(self.mod_urls)
+        depth = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while len(level_urls) != 0:
+                resolved = []
+                for mod_url, info in zip(level_urls, executor.map(self.__resolve_single, level_urls)):
+                    self.mod_infos[mod_url] = info
+                    if info is None or len(info) == 0:
+                        continue
+                    mod_ids.setdefault(info['mod_id'], mod_url)
+                    self.dependency_graph[info['mod_id']] = self.__get_required_dependencies(info)
+                    if len(self.dependency_graph[info['mod_id']]) == 0:
+                        logger.log_info('The mod \"%s\" has no dependencies that need to be downloaded' %
+                                        info['mod_name'])
+                    resolved.append(info)
+                level_urls = self.__expand_dependencies(resolved, mod_ids, known_urls)
+                added_urls.extend(level_urls)
+                depth += 1
+
+        for cycle in self.__find_dependency_cycles():
+            logger.log_warning('Found a dependency cycle: %s' %
+                               ' -> '.join(self.mod_jsons.get(mod_id, {}).get('name', str(mod_id))
+                                           for mod_id in cycle))
+        logger.log_info('Resolved %s mods in %s dependency levels, %s of them missing from the mods list' %
+                        (len(self.mod_urls) + len(added_urls), depth, len(added_urls)))
+        return added_urls
+
+    #########################################################
+    # PLAN FUNCTIONS
+    #########################################################
+
+    def __get_planned_file(self, latest_file: FileRecord) -> PlannedFile:
+        file_name = latest_file.file_name
+        download_url = latest_file.download_url
+        if download_url is None:
+            download_url = CURSEFORGE_FILES % (str(latest_file.id)[:4], str(latest_file.id)[4:], file_name)
+        return PlannedFile(latest_file.id, file_name, latest_file.file_date, latest_file.file_length, download_url,
+                           latest_file.hash_algo, latest_file.hash, latest_file.fingerprint)
+
+    def __get_bytes_to_fetch(self, target: PlannedFile) -> int:
+        if target.file_length is None:
+            return 0
+        if self.store is not None:
+            blob = self.store.get_blob(target.file_id, target.hash)
+            if self.store.contains(blob, target.file_length):
+                return 0
+            temp_path = self.store.get_blob_path(blob) + DOWNLOAD_SUFFIX
+        else:
+            temp_path = os.path.join(self.output_path, target.file_name + DOWNLOAD_SUFFIX)
+        # A partial download of the file is resumed instead of fetched again
+        downloaded = self.__get_file_size(temp_path) if os.path.isfile(temp_path) else 0
+        return max(0, target.file_length - downloaded)
+
+    def __plan_unchanged(self, url: str) -> ModPlan:
+        mod_id = curseforge_cache.get_mod_id(self.__get_mod_preinfo(url)['mod_slug'])
+        mod_json = self.mod_jsons.get(mod_id, {})
+        return ModPlan(url, PlanAction.UNCHANGED, mod_id, mod_json.get('name'), mod_json.get('dateModified'),
+                       (self.manifest[mod_id]['file_name'],))
+
+    def __plan_single(self, url: str, info: Optional[Dict[str, Any]]) -> ModPlan:
+        url = url.strip()
+        if info is None:
+            return self.__plan_unchanged(url)
+        if len(info) == 0:
+            return ModPlan(url, PlanAction.ERROR)
+
+        mod_id = info['mod_id']
+        date_modified = self.mod_jsons.get(mod_id, {}).get('dateModified')
+        current_files = tuple(info['existing_files'])
+        target = self.__get_planned_file(info['latest_file'])
+        dependencies = tuple(self.dependency_graph.get(mod_id, ()))
+        if not self.__check_for_updates(info):
+            return ModPlan(url, PlanAction.UP_TO_DATE, mod_id, info['mod_name'], date_modified, current_files,
+                           target, dependencies=dependencies)
+
+        action = PlanAction.UPDATE if len(current_files) != 0 else PlanAction.DOWNLOAD
+        # A file of the same name is replaced by the download, so it is not removed separately
+        files_to_remove = tuple(file_name for file_name in current_files if file_name != target.file_name)
+        return ModPlan(url, action, mod_id, info['mod_name'], date_modified, current_files, target,
+                       self.__get_bytes_to_fetch(target), files_to_remove, dependencies)
+
+    def __create_plan(self) -> Plan:
+        with curseforge_metrics.phase('plan'):
+            if not self.offline:
+                with curseforge_metrics.phase('prefetch'):
+                    self.__prefetch_games()
+                    self.__prefetch_mods()
+            if self.fingerprints:
+                with curseforge_metrics.phase('fingerprints'):
+                    self.__identify_local_files()
+            self.unidentified_files = any(file_name not in self.local_file_mods
+                                          for file_name in self.catalog.names())
+            curseforge_cache.flush()
+            if self.incremental:
+                self.manifest = curseforge_cache.get_manifest(self.output_path)
+
+            self.page_executor = ThreadPoolExecutor(max_workers=self.workers)
+            try:
+                with curseforge_metrics.phase('resolve'):
+                    added_urls = self.__resolve_dependencies()
+                mods = tuple(self.__plan_single(mod_url, self.mod_infos[mod_url])
+                             for mod_url in self.mod_urls + added_urls)
+            finally:
+                self.page_executor.shutdown()
+                self.page_executor = None
+                self.mod_infos.clear()
+                curseforge_cache.flush()
+            plan = Plan(self.output_path, self.__get_filter_key(), mods, tuple(added_urls))
+            for action in PlanAction:
+                curseforge_metrics.count('planned', action.value, plan.count(action))
+            logger.log_info('Planned %s downloads of %s mods, %s KiB in total' %
+                            (sum(1 for mod_plan in mods if mod_plan.needs_download), len(mods),
+                             plan.bytes_to_fetch // 1024))
+            return plan
+
+    #########################################################
+    # EXECUTION FUNCTIONS
+    #########################################################
+
+    def __execute_all(self, plan: Plan):
+        # Everything but the downloads is quick, the downloads are handed to the scheduler in one batch
+        results: Dict[int, DownloadStatus] = {}
+        downloads = []
+        for index, mod_plan in enumerate(plan.mods):
+            if mod_plan.needs_download and not self.offline:
+                downloads.append((index, mod_plan.bytes_to_fetch))
+            else:
+                results[index] = self.__execute_single(mod_plan)
+
+        if len(downloads) != 0:
+            self.scheduler = DownloadScheduler(self.max_downloads, self.bandwidth_limit)
+            futures = self.scheduler.run(downloads, lambda index: self.__execute_single(plan.mods[index]))
+            for index, future in futures:
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.log_severe('Unexpected error while processing mod \"%s\": %s' % (plan.mods[index].url, e))
+                    results[index] = self.DownloadStatus.ERROR
+
+        # Results are collected in the order of the mods list, not the order of completion
+        for index, mod_plan in enumerate(plan.mods):
+            self.process_results.append((mod_plan.url, results[index].value))
+            curseforge_metrics.count('results', results[index].value)
+
+    def __get_slug_rows(self, sections: json, first: Optional[str] = None) -> List[Tuple[int, str, str]]:
+        # Slugs and names are unique in the cache, the first section of each wins. Sections with the key first
+        # set come before all others.
+        if first is not None:
+            sections = sorted(sections, key=lambda section: not section.get(first, False))
+        rows = []
+        slugs = set()
+        names = set()
+        for section in sections:
+            if 'id' not in section or 'slug' not in section or 'name' not in section:
+                continue
+            if section['slug'] in slugs or section['name'] in names:
+                continue
+            slugs.add(section['slug'])
+            names.add(section['name'])
+            rows.append((section['id'], section['slug'], section['name']))
+        return rows
+
+    def __prefetch_games(self):
+        # Every game and category of the mods list is resolved up front with one request per list, instead of
+        # by whichever workers need them first
+        pairs = set()
+        for mod_url in self.mod_urls:
+            preinfo = self.__get_mod_preinfo(mod_url)
+            if len(preinfo) != 0:
+                pairs.add((preinfo['game_slug'], preinfo['category_slug']))
+        pairs = [(game_slug, category_slug) for game_slug, category_slug in pairs
+                 if curseforge_cache.get_game_id(game_slug) is None or
+                 curseforge_cache.get_category_id(category_slug) is None]
+        if len(pairs) == 0:
+            return
+
+        if any(curseforge_cache.get_game_id(game_slug) is None for game_slug, _ in pairs):
+            games = []
+            index = 0
+            while True:
+                query = self.__query_api('games', {'index': index, 'pageSize': GAMES_PAGE_SIZE})
+                if query is None:
+                    break
+                games.extend(query['data'])
+                index += GAMES_PAGE_SIZE
+                if index >= query.get('pagination', {}).get('totalCount', 0):
+                    break
+            curseforge_cache.add_games(self.__get_slug_rows(games))
+
+        game_ids = set(curseforge_cache.get_game_id(game_slug) for game_slug, category_slug in pairs
+                       if curseforge_cache.get_category_id(category_slug) is None)
+        for game_id in game_ids - {None}:
+            query = self.__query_api('categories', {'gameId': game_id})
+            if query is not None:
+                # Class categories are the ones in mod URLs, they win over subcategories of the same name
+                curseforge_cache.add_categories(self.__get_slug_rows(query['data'], 'isClass'))
+        curseforge_cache.flush()
+        logger.log_info('Prefetched the games and categories of %s pairs of slugs' % len(pairs))
+
+    def __prefetch_mods(self):
+        # Mods whose IDs are already cached are resolved together through the bulk endpoint
+        mod_ids = []
         for mod_url in self.mod_urls:
-            result = self.__download_single(mod_url)
-            self.process_results.append((mod_url, result.value))
+            preinfo = self.__get_mod_preinfo(mod_url)
+            if len(preinfo) == 0:
+                continue
+            mod_id = curseforge_cache.get_mod_id(preinfo['mod_slug'])
+            if mod_id is not None:
+                mod_ids.append(mod_id)
+        if len(mod_ids) != 0:
+            logger.log_info('Resolving %s cached mods in batches of %s' % (len(mod_ids), self.bulk_size))
+            self.__query_mod_jsons(mod_ids)
+
+    def __execute_plan(self, plan: Plan):
+        self.__init_output_path()
+        if len(plan.dependencies_to_add) != 0:
+            self.__add_mods_to_file(list(plan.dependencies_to_add))
+            self.mod_urls.extend(plan.dependencies_to_add)
+
+        self.scheduler = None
+        try:
+            with curseforge_metrics.phase('execute'):
+                self.__execute_all(plan)
+            if self.store is not None:
+                with curseforge_metrics.phase('garbage_collection'):
+                    self.store.collect_garbage()
+        finally:
+            curseforge_cache.flush()
         logger.log_info('Finished downloading all mods')
+
+    def __process_all(self):
+        pre_time = datetime.now()
+        self.__execute_plan(self.__create_plan())
         post_time = datetime.now()
 
         self.__print_results(self.__get_time_difference(pre_time, post_time))
+
+    #########################################################
+    # PUBLIC FUNCTIONS
+    #########################################################
+
+    def plan_all(self, incremental: bool = False) -> Plan:
+        # Only queries the API, nothing in the output folder or the mods list is changed
+        self.incremental = incremental
+        return self.__create_plan()
+
+    def execute_plan(self, plan: Plan):
+        pre_time = datetime.now()
+        self.__execute_plan(plan)
+        post_time = datetime.now()
+
+        self.__print_results(self.__get_time_difference(pre_time, post_time))
+
+    def download_all(self):
+        self.incremental = False
+        self.__process_all()
+
+    def update_all(self):
+        # Mods whose dateModified matches the manifest of the previous run are skipped without querying their files
+        self.incremental = True
+        self.__process_all()
+
+    def check_for_updates(self, plan_path: str = None) -> Plan:
+        pre_time = datetime.now()
+        plan = self.plan_all(True)
+        if plan_path is not None:
+            plan.save(plan_path)
+        post_time = datetime.now()
+
+        self.__print_plan(plan, self.__get_time_difference(pre_time, post_time))
+        return plan
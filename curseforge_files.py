@@ -0,0 +1,92 @@
+import calendar
+import sys
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from curseforge_api_schemas import HashAlgo
+
+# Hashes that can verify a download, in order of preference
+HASH_ALGOS = (HashAlgo.SHA1.value, HashAlgo.MD5.value)
+
+# Files of a mod share a handful of game version lists, each distinct list is kept once
+versions_cache: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+@lru_cache(maxsize=4096)
+def __get_day_seconds(day: str) -> int:
+    # Files of a mod are mostly uploaded on a few days, so the calendar is only consulted once per day
+    return calendar.timegm((int(day[0:4]), int(day[5:7]), int(day[8:10]), 0, 0, 0, 0, 0, 0))
+
+
+def parse_timestamp(file_date: Optional[str]) -> float:
+    # Seconds since the epoch of an ISO timestamp like 2021-01-01T10:00:00.123Z, the fraction is optional
+    if file_date is None or len(file_date) < 19:
+        return 0.0
+    seconds = __get_day_seconds(file_date[:10]) + int(file_date[11:13]) * 3600 + int(file_date[14:16]) * 60 + \
+        int(file_date[17:19])
+    if len(file_date) > 20 and file_date[19] == '.':
+        seconds += float('0.' + file_date[20:].rstrip('Z'))
+    return seconds
+
+
+def intern_versions(game_versions: Optional[list]) -> Optional[Tuple[str, ...]]:
+    if game_versions is None:
+        return None
+    versions = tuple(sys.intern(version) for version in game_versions)
+    return versions_cache.setdefault(versions, versions)
+
+
+class FileRecord:
+    # Only the fields of a file JSON that the downloader reads. Listings of large mods hold thousands of these.
+    __slots__ = ('id', 'file_name', 'file_date', 'timestamp', 'game_versions', 'release_type', 'file_length',
+                 'download_url', 'hash_algo', 'hash', 'dependencies', 'fingerprint')
+
+    id: int
+    file_name: str
+    file_date: Optional[str]
+    timestamp: float  # file_date in seconds since the epoch, 0 without a date
+    game_versions: Optional[Tuple[str, ...]]
+    release_type: Optional[int]  # FileReleaseType value
+    file_length: Optional[int]
+    download_url: Optional[str]
+    hash_algo: Optional[int]  # HashAlgo value
+    hash: Optional[str]
+    dependencies: Tuple[Tuple[Optional[int], Optional[int]], ...]  # (mod ID, FileRelationType value)
+    fingerprint: Optional[int]
+
+    def __init__(self, file_json: Dict[str, Any]):
+        self.id = file_json['id']
+        self.file_name = file_json['fileName']
+        self.file_date = file_json.get('fileDate')
+        self.timestamp = parse_timestamp(self.file_date)
+        self.game_versions = intern_versions(file_json.get('gameVersions'))
+        self.release_type = file_json.get('releaseType')
+        self.file_length = file_json.get('fileLength')
+        self.download_url = file_json.get('downloadUrl')
+        hashes = {hash_json.get('algo'): hash_json.get('value') for hash_json in file_json.get('hashes', [])}
+        self.hash_algo = next((algo for algo in HASH_ALGOS if hashes.get(algo) is not None), None)
+        self.hash = hashes.get(self.hash_algo)
+        self.dependencies = tuple((dependency.get('modId'), dependency.get('relationType'))
+                                  for dependency in file_json.get('dependencies', []))
+        self.fingerprint = file_json.get('fileFingerprint')
+
+    def to_json(self) -> Dict[str, Any]:
+        # The same keys as the API, so listings that were cached before keep working
+        file_json = {'id': self.id, 'fileName': self.file_name}
+        if self.file_date is not None:
+            file_json['fileDate'] = self.file_date
+        if self.game_versions is not None:
+            file_json['gameVersions'] = list(self.game_versions)
+        if self.release_type is not None:
+            file_json['releaseType'] = self.release_type
+        if self.file_length is not None:
+            file_json['fileLength'] = self.file_length
+        if self.download_url is not None:
+            file_json['downloadUrl'] = self.download_url
+        if self.hash_algo is not None:
+            file_json['hashes'] = [{'value': self.hash, 'algo': self.hash_algo}]
+        file_json['dependencies'] = [{'modId': mod_id, 'relationType': relation_type}
+                                     for mod_id, relation_type in self.dependencies]
+        if self.fingerprint is not None:
+            file_json['fileFingerprint'] = self.fingerprint
+        return file_json
@@ -0,0 +1,75 @@
+from array import array
+from typing import Iterable, List, Optional, Sequence, FrozenSet
+
+from curseforge_api_schemas import FileReleaseType
+from curseforge_files import FileRecord
+
+
+class FileFilter:
+    versions: FrozenSet[str]
+    excluded_versions: FrozenSet[str]
+    release_mask: int  # bit (1 << release type value) is set for every allowed release type
+    tiers: List[int]  # release type values in order of preference
+
+    def __init__(self,
+                 versions_list: List[str],
+                 excluded_versions_list: List[str],
+                 release_types_list: List[FileReleaseType]):
+        self.versions = frozenset(versions_list)
+        # A version that is both wanted and excluded counts as wanted
+        self.excluded_versions = frozenset(excluded_versions_list) - self.versions
+        self.tiers = [release_type.value for release_type in release_types_list]
+        self.release_mask = 0
+        for tier in self.tiers:
+            self.release_mask |= 1 << tier
+
+    #########################################################
+    # MATCHING FUNCTIONS
+    #########################################################
+
+    def is_version_compatible(self, record: FileRecord) -> bool:
+        game_versions = record.game_versions
+        if game_versions is None or self.excluded_versions.intersection(game_versions):
+            return False
+        return not self.versions.isdisjoint(game_versions)
+
+    def is_compatible(self, record: FileRecord, release_mask: int = None) -> bool:
+        release_type = record.release_type
+        if release_type is None:
+            return False
+        if not (1 << release_type) & (self.release_mask if release_mask is None else release_mask):
+            return False
+        return self.is_version_compatible(record)
+
+    def filter(self, records: Sequence[FileRecord]) -> array:
+        # Indexes into the records instead of a copy of the list
+        return array('I', (index for index, record in enumerate(records) if self.is_compatible(record)))
+
+    #########################################################
+    # SELECTION FUNCTIONS
+    #########################################################
+
+    def select_latest(self, records: Sequence[FileRecord], indexes: Iterable[int] = None) -> Optional[FileRecord]:
+        # One pass keeps the newest file of every release type, then the most preferred type wins
+        best = {}
+        for index in range(len(records)) if indexes is None else indexes:
+            record = records[index]
+            if record.file_date is None or not self.is_compatible(record):
+                continue
+            release_type = record.release_type
+            if release_type not in best or record.timestamp > best[release_type].timestamp:
+                best[release_type] = record
+        for tier in self.tiers:
+            if tier in best:
+                return best[tier]
+        return None
+
+    def first_preferred(self, records: Sequence[FileRecord]) -> Optional[FileRecord]:
+        # In date-sorted results the first file of the most preferred release type is its newest
+        if len(self.tiers) == 0:
+            return None
+        preferred_mask = 1 << self.tiers[0]
+        for record in records:
+            if self.is_compatible(record, preferred_mask):
+                return record
+        return None
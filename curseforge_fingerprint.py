@@ -0,0 +1,88 @@
+import os
+import sys
+from array import array
+from typing import Dict, List
+
+# Optional dependency: numpy mixes all words of a file at once instead of one at a time
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# CurseForge fingerprints are MurmurHash2 with seed 1 over the file without whitespace bytes
+SEED = 1
+MULTIPLIER = 0x5bd1e995
+MASK = 0xFFFFFFFF
+WHITESPACE = b'\t\n\r '
+WORD_TYPE = 'I' if array('I').itemsize == 4 else 'L'
+
+# Below this many bytes in total, starting worker processes costs more than it saves
+PROCESS_THRESHOLD = 16 * 1024 * 1024
+
+
+#########################################################
+# HASH FUNCTIONS
+#########################################################
+
+def __mix_words(data: bytes, length: int) -> List[int]:
+    if numpy is not None:
+        words = numpy.frombuffer(data, dtype='<u4', count=length // 4)
+        # uint32 arithmetic wraps around exactly like the 32-bit C implementation
+        words = words * numpy.uint32(MULTIPLIER)
+        words ^= words >> numpy.uint32(24)
+        words *= numpy.uint32(MULTIPLIER)
+        return words.tolist()
+
+    words = array(WORD_TYPE)
+    words.frombytes(data[:length - (length & 3)])
+    if sys.byteorder == 'big':
+        words.byteswap()
+    result = []
+    for k in words:
+        k = (k * MULTIPLIER) & MASK
+        k ^= k >> 24
+        result.append((k * MULTIPLIER) & MASK)
+    return result
+
+
+def fingerprint_bytes(data: bytes) -> int:
+    data = data.translate(None, WHITESPACE)
+    length = len(data)
+    h = (SEED ^ length) & MASK
+    for k in __mix_words(data, length):
+        h = ((h * MULTIPLIER) & MASK) ^ k
+
+    remainder = length & 3
+    tail = length - remainder
+    if remainder == 3:
+        h ^= data[tail + 2] << 16
+    if remainder >= 2:
+        h ^= data[tail + 1] << 8
+    if remainder >= 1:
+        h ^= data[tail]
+        h = (h * MULTIPLIER) & MASK
+
+    h ^= h >> 13
+    h = (h * MULTIPLIER) & MASK
+    h ^= h >> 15
+    return h
+
+
+def fingerprint_file(file_path: str) -> int:
+    with open(file_path, 'rb') as file:
+        return fingerprint_bytes(file.read())
+
+
+def fingerprint_files(file_paths: List[str], processes: int = None) -> Dict[str, int]:
+    if len(file_paths) == 0:
+        return {}
+    total_size = sum(os.path.getsize(file_path) for file_path in file_paths)
+    if len(file_paths) == 1 or total_size < PROCESS_THRESHOLD:
+        return {file_path: fingerprint_file(file_path) for file_path in file_paths}
+
+    # Hashing is CPU bound, so files are spread across processes instead of threads. multiprocessing is only
+    # imported once there are enough files for it.
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        fingerprints = executor.map(fingerprint_file, file_paths, chunksize=4)
+        return dict(zip(file_paths, fingerprints))
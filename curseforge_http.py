@@ -0,0 +1,358 @@
+import importlib.util
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, TYPE_CHECKING
+from urllib.parse import urlparse
+
+import curseforge_metrics
+import logger
+
+# requests, urllib3 and the .env file are only loaded once the first request is made, so a run that is served
+# from the cache never pays for them
+if TYPE_CHECKING:
+    from requests import Response, Session
+
+# Optional dependencies: brotli lets urllib3 decode 'br' responses, orjson decodes JSON several times faster.
+# urllib3 imports brotli itself, it only has to be installed.
+if importlib.util.find_spec('brotli') is not None:
+    API_ENCODINGS = 'br, gzip, deflate'
+else:
+    API_ENCODINGS = 'gzip, deflate'
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.11 (KHTML, like Gecko) Chrome/23.0.1271.64 Safari/537.11',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.3',
+    'Accept-Encoding': 'identity',
+    'Accept-Language': 'en-US,en;q=0.8',
+    'Connection': 'keep-alive',
+}
+
+# Only sent to the API. The CDN does not need the key, and jars are already compressed.
+API_HEADERS = {
+    'Accept': 'application/json',
+    'Accept-Encoding': API_ENCODINGS,
+    'x-api-key': None  # read from the environment or .env when the session is created
+}
+
+# The amount of distinct hosts that keep a connection pool (API, CDN and redirect targets)
+POOL_HOSTS = 4
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+
+# Retry delays grow exponentially from the base up to the cap, with full jitter
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+# After this many failures in a row a host is paused for every worker, longer with every trip
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 10.0
+BREAKER_MAX_COOLDOWN = 120.0
+
+requests = None  # the requests module, imported by the first request
+session: Optional['Session'] = None
+pool_connections = 1  # keep-alive connections per host
+timeout: Tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+lock = threading.Lock()
+
+# API response sizes of this run, as received over the wire and after decompression
+bytes_received = 0
+bytes_decoded = 0
+
+# Throttling of this run: 429 responses, circuit breaker trips and the seconds spent waiting on both
+throttled = 0
+breaker_trips = 0
+limiter_wait = 0.0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # The tokens are reserved right away, so callers wait in the order they arrived
+            self.tokens -= tokens
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+
+class CircuitBreaker:
+    def __init__(self, host: str):
+        self.host = host
+        self.failures = 0
+        self.trips = 0
+        self.paused_until = 0.0
+        self.paused_total = 0.0  # seconds the host was paused, however many workers waited for it
+        self.lock = threading.Lock()
+
+    def __extend_pause(self, until: float):
+        # Only the part of the new pause that does not overlap the current one adds to the total. Called with the lock.
+        start = max(self.paused_until, time.monotonic())
+        if until > start:
+            self.paused_total += until - start
+        self.paused_until = max(self.paused_until, until)
+
+    def wait(self) -> float:
+        wait_time = self.paused_until - time.monotonic()
+        if wait_time <= 0:
+            return 0.0
+        time.sleep(wait_time)
+        return wait_time
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.__extend_pause(time.monotonic() + seconds)
+
+    def record(self, success: bool) -> bool:
+        with self.lock:
+            if success:
+                self.failures = 0
+                return False
+            self.failures += 1
+            if self.failures < BREAKER_THRESHOLD:
+                return False
+            self.failures = 0
+            self.trips += 1
+            cooldown = min(BREAKER_MAX_COOLDOWN, BREAKER_COOLDOWN * 2 ** (self.trips - 1))
+            self.__extend_pause(time.monotonic() + cooldown)
+        logger.log_warning('(HTTP) %s is failing, pausing all requests to it for %s seconds' % (self.host, cooldown))
+        return True
+
+
+limiter = TokenBucket(0, 1)
+breakers: Dict[str, CircuitBreaker] = {}
+
+
+#########################################################
+# SESSION FUNCTIONS
+#########################################################
+
+def get_pool_size(workers: int, max_downloads: int = 0) -> int:
+    # The resolve workers and the page fetchers each run workers API requests at once, and the scheduler runs up to
+    # max_downloads downloads. pool_block would otherwise cap them at the size of the pool instead.
+    return max(workers * 2, max_downloads)
+
+
+def connect(pool_size: int = 1,
+            connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+            read_timeout: float = DEFAULT_READ_TIMEOUT,
+            requests_per_second: float = 0):
+    # The session itself is created by the first request
+    global session, pool_connections, timeout, limiter
+    with lock:
+        if session is not None:
+            session.close()
+        session = None
+        pool_connections = max(1, pool_size)
+        timeout = (connect_timeout, read_timeout)
+        # Short bursts of up to one second of requests are allowed before the limit applies
+        limiter = TokenBucket(requests_per_second, requests_per_second)
+
+
+def close():
+    global session
+    with lock:
+        if session is not None:
+            session.close()
+        session = None
+
+
+def __import_requests():
+    global requests
+    if requests is None:
+        import requests as requests_module
+        from dotenv import load_dotenv
+        load_dotenv(os.path.join(os.getcwd(), '.env'))
+        API_HEADERS['x-api-key'] = os.environ.get('ETERNAL_API_KEY')
+        requests = requests_module
+    return requests
+
+
+def __get_session() -> 'Session':
+    global session
+    current_session = session
+    if current_session is not None:
+        return current_session
+    with lock:
+        if session is not None:
+            return session
+        with curseforge_metrics.phase('http_setup'):
+            __import_requests()
+            from requests.adapters import HTTPAdapter
+            # Every host gets its own pool of pool_connections keep-alive connections, one for each worker.
+            # pool_block makes extra workers wait for a free connection instead of opening throwaway ones.
+            adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_connections,
+                                  pool_block=True)
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+    logger.log_info('(HTTP) Opened connection pools of size %s' % pool_connections)
+    return session
+
+
+def __getattr__(name: str) -> Any:
+    # The exceptions of requests are caught as curseforge_http.RequestException. They are only raised by a request,
+    # so requests has already been imported by the time the except clause looks the name up.
+    if name == 'RequestException':
+        return __import_requests().RequestException
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+#########################################################
+# REQUEST FUNCTIONS
+#########################################################
+
+def __get_breaker(url: str) -> CircuitBreaker:
+    host = urlparse(url).netloc
+    with lock:
+        if host not in breakers:
+            breakers[host] = CircuitBreaker(host)
+        return breakers[host]
+
+
+def __get_endpoint(url: str) -> str:
+    # IDs are left out of the label, so every mod and file shares the histogram of its endpoint
+    path = urlparse(url).path
+    return re.sub(r'/\d+(?=/|$)', '/{id}', re.sub(r'^/v\d+', '', path)) or '/'
+
+
+def __add_wait(limited: float):
+    global limiter_wait
+    with lock:
+        limiter_wait += limited
+
+
+def get_breaker_wait() -> float:
+    # Wall clock time that hosts were paused, not the sum of the waits of every worker
+    with lock:
+        return sum(breaker.paused_total for breaker in breakers.values())
+
+
+def __request(method: str, url: str, endpoint: str, limited: bool, **kwargs) -> 'Response':
+    global throttled, breaker_trips
+    breaker = __get_breaker(url)
+    breaker.wait()
+    __add_wait(limiter.acquire() if limited else 0.0)
+    # The latency is the time until the headers arrived, a streamed body is read later
+    # The session is created first, it also fills in the API key of the headers
+    current_session = __get_session()
+    start = time.perf_counter()
+    try:
+        response = current_session.request(method, url, timeout=timeout, **kwargs)
+    except requests.RequestException:
+        curseforge_metrics.count('request_errors', endpoint)
+        if breaker.record(False):
+            with lock:
+                breaker_trips += 1
+        raise
+    curseforge_metrics.observe('request', endpoint, time.perf_counter() - start)
+    curseforge_metrics.count('requests', endpoint)
+    curseforge_metrics.count('responses', str(response.status_code))
+
+    if response.status_code == 429:
+        with lock:
+            throttled += 1
+        # Every worker waits for the time the server asked for, not only the one that was throttled
+        breaker.pause(get_retry_after(response) or BACKOFF_BASE)
+    if breaker.record(response.status_code != 429 and response.status_code < 500):
+        with lock:
+            breaker_trips += 1
+    return response
+
+
+def get(url: str, params: Dict = None, headers: Dict[str, str] = None, stream: bool = False) -> 'Response':
+    return __request('GET', url, urlparse(url).netloc, False, params=params, headers=headers, stream=stream)
+
+
+def get_api(url: str, params: Dict = None) -> 'Response':
+    return __request('GET', url, __get_endpoint(url), True, params=params, headers=API_HEADERS)
+
+
+def post_api(url: str, body: Any) -> 'Response':
+    return __request('POST', url, __get_endpoint(url), True, json=body, headers=API_HEADERS)
+
+
+def download(url: str, headers: Dict[str, str] = None) -> 'Response':
+    return __request('GET', url, 'download', False, headers=headers, stream=True)
+
+
+def read_json(response: 'Response') -> Any:
+    global bytes_received, bytes_decoded
+    content = response.content
+    # tell() counts the bytes read from the socket, before the body was decompressed
+    received = response.raw.tell() if response.raw is not None else len(content)
+    with lock:
+        bytes_received += received
+        bytes_decoded += len(content)
+    return json_loads(content)
+
+
+def get_bytes_saved() -> int:
+    return max(0, bytes_decoded - bytes_received)
+
+
+def get_stats() -> Dict[str, float]:
+    return {
+        'api_bytes_received': bytes_received,
+        'api_bytes_decoded': bytes_decoded,
+        'throttled': throttled,
+        'breaker_trips': breaker_trips,
+        'limiter_wait_seconds': limiter_wait,
+        'breaker_wait_seconds': get_breaker_wait(),
+    }
+
+
+curseforge_metrics.register_collector(get_stats)
+
+
+#########################################################
+# RETRY FUNCTIONS
+#########################################################
+
+def is_retryable(response: Optional['Response']) -> bool:
+    # No response means the connection failed. Other client errors will not change by asking again.
+    return response is None or response.status_code == 429 or response.status_code >= 500
+
+
+def get_retry_after(response: 'Response') -> Optional[float]:
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is None:
+        return None
+    # A server could ask for any delay, it is never longer than the longest pause of the circuit breaker
+    if retry_after.strip().isdigit():
+        return min(BREAKER_MAX_COOLDOWN, float(retry_after))
+    from email.utils import parsedate_to_datetime
+    try:
+        return min(BREAKER_MAX_COOLDOWN, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt: int, response: Optional['Response'] = None):
+    delay = get_retry_after(response) if response is not None else None
+    if delay is None:
+        delay = random.uniform(BACKOFF_BASE, max(BACKOFF_BASE, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt)))
+    time.sleep(delay)
@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+# Upper bounds in seconds of the histogram buckets, the last bucket takes everything above
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Metric names in the Prometheus text format start with this prefix
+PROMETHEUS_PREFIX = 'curseforge_'
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        index = 0
+        while index < len(BUCKETS) and value > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def get_quantile(self, quantile: float) -> float:
+        # The upper bound of the bucket that holds the quantile, good enough to spot regressions
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count != 0:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return 0.0
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.total / self.count if self.count != 0 else 0.0,
+            'p50': self.get_quantile(0.5),
+            'p95': self.get_quantile(0.95),
+            'max': self.max,
+            'buckets': {str(bound): count for bound, count in zip(BUCKETS + ('+Inf',), self.counts)},
+        }
+
+
+# (name, label) -> value. Phases are wall time in seconds, counters are totals, histograms are latencies.
+phases: Dict[Tuple[str, str], float] = {}
+counters: Dict[Tuple[str, str], float] = {}
+histograms: Dict[Tuple[str, str], Histogram] = {}
+# Functions of other modules that return their own statistics when a report is made
+collectors: List[Callable[[], Dict[str, float]]] = []
+started = time.time()
+lock = threading.Lock()
+
+
+#########################################################
+# RECORDING FUNCTIONS
+#########################################################
+
+@contextmanager
+def phase(name: str, label: str = ''):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with lock:
+            phases[(name, label)] = phases.get((name, label), 0.0) + elapsed
+
+
+def count(name: str, label: str = '', amount: float = 1):
+    with lock:
+        counters[(name, label)] = counters.get((name, label), 0) + amount
+
+
+def observe(name: str, label: str, seconds: float):
+    with lock:
+        if (name, label) not in histograms:
+            histograms[(name, label)] = Histogram()
+        histograms[(name, label)].observe(seconds)
+
+
+def register_collector(collector: Callable[[], Dict[str, float]]):
+    collectors.append(collector)
+
+
+def get_phase(name: str, label: str = '') -> float:
+    return phases.get((name, label), 0.0)
+
+
+def reset():
+    global started
+    with lock:
+        phases.clear()
+        counters.clear()
+        histograms.clear()
+        started = time.time()
+
+
+#########################################################
+# REPORT FUNCTIONS
+#########################################################
+
+def __get_key(name: str, label: str) -> str:
+    return '%s[%s]' % (name, label) if len(label) != 0 else name
+
+
+def get_report() -> Dict[str, Any]:
+    gauges = {}
+    for collector in collectors:
+        gauges.update(collector())
+    with lock:
+        return {
+            'started': started,
+            'duration': time.time() - started,
+            'phases': {__get_key(*key): value for key, value in phases.items()},
+            'counters': {__get_key(*key): value for key, value in counters.items()},
+            'histograms': {__get_key(*key): histogram.to_json() for key, histogram in histograms.items()},
+            'gauges': gauges,
+        }
+
+
+def __prometheus_line(name: str, labels: Dict[str, str], value: float) -> str:
+    label_text = ','.join('%s="%s"' % (key, str(label).replace('"', '\\"')) for key, label in labels.items())
+    return '%s%s%s %s' % (PROMETHEUS_PREFIX, name, '{%s}' % label_text if label_text else '', value)
+
+
+def to_prometheus() -> str:
+    report = get_report()
+    lines = ['# TYPE %sphase_seconds gauge' % PROMETHEUS_PREFIX]
+    with lock:
+        for (name, label), value in phases.items():
+            lines.append(__prometheus_line('phase_seconds', {'phase': name, 'label': label}, value))
+        typed = set()
+        for (name, label), value in sorted(counters.items()):
+            if name not in typed:
+                lines.append('# TYPE %s%s_total counter' % (PROMETHEUS_PREFIX, name))
+                typed.add(name)
+            lines.append(__prometheus_line('%s_total' % name, {'label': label}, value))
+        for (name, label), histogram in sorted(histograms.items()):
+            if name not in typed:
+                lines.append('# TYPE %s%s_seconds histogram' % (PROMETHEUS_PREFIX, name))
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += bucket_count
+                lines.append(__prometheus_line('%s_seconds_bucket' % name, {'label': label, 'le': bound}, cumulative))
+            lines.append(__prometheus_line('%s_seconds_sum' % name, {'label': label}, histogram.total))
+            lines.append(__prometheus_line('%s_seconds_count' % name, {'label': label}, histogram.count))
+    for name, value in report['gauges'].items():
+        lines.append('# TYPE %s%s gauge' % (PROMETHEUS_PREFIX, name))
+        lines.append(__prometheus_line(name, {}, value))
+    return '\n'.join(lines) + '\n'
+
+
+def save_report(file_path: str):
+    with open(file_path, 'w') as file:
+        json.dump(get_report(), file, indent=4)
+
+
+def save_prometheus(file_path: str):
+    with open(file_path, 'w') as file:
+        file.write(to_prometheus())
@@ -0,0 +1,66 @@
+import json
+from dataclasses import dataclass, asdict
+from enum import Enum
+from typing import Optional, Tuple
+
+
+class PlanAction(Enum):
+    DOWNLOAD = 'Download'  # no file of the mod is in the output folder yet
+    UPDATE = 'Update'  # an older file of the mod is replaced
+    UP_TO_DATE = 'Up to date'
+    UNCHANGED = 'Unchanged'  # the mod was not modified since the file of the last run was chosen
+    ERROR = 'Error'
+
+
+@dataclass(frozen=True)
+class PlannedFile:
+    file_id: int
+    file_name: str
+    file_date: str
+    file_length: Optional[int]
+    download_url: str
+    hash_algo: Optional[int]  # HashAlgo value
+    hash: Optional[str]
+    fingerprint: Optional[int]
+
+
+@dataclass(frozen=True)
+class ModPlan:
+    url: str
+    action: PlanAction
+    mod_id: Optional[int] = None
+    mod_name: Optional[str] = None
+    date_modified: Optional[str] = None  # dateModified of the mod when it was planned
+    current_files: Tuple[str, ...] = ()
+    target: Optional[PlannedFile] = None
+    bytes_to_fetch: int = 0  # without the bytes of a partial download that will be resumed
+    files_to_remove: Tuple[str, ...] = ()
+    dependencies: Tuple[int, ...] = ()  # IDs of the required dependencies of the target file
+
+    @property
+    def needs_download(self) -> bool:
+        return self.action == PlanAction.DOWNLOAD or self.action == PlanAction.UPDATE
+
+
+@dataclass(frozen=True)
+class Plan:
+    output_path: str
+    filter_key: str
+    mods: Tuple[ModPlan, ...]
+    dependencies_to_add: Tuple[str, ...]  # URLs of required dependencies that are missing from the mods list
+
+    @property
+    def bytes_to_fetch(self) -> int:
+        return sum(mod_plan.bytes_to_fetch for mod_plan in self.mods)
+
+    def count(self, action: PlanAction) -> int:
+        return sum(1 for mod_plan in self.mods if mod_plan.action == action)
+
+    def to_json(self, indent: int = None) -> str:
+        plan_json = asdict(self)
+        plan_json['bytes_to_fetch'] = self.bytes_to_fetch
+        return json.dumps(plan_json, indent=indent, default=lambda value: value.value)
+
+    def save(self, file_path: str):
+        with open(file_path, 'w') as file:
+            file.write(self.to_json(indent=4))
@@ -0,0 +1,28 @@
+import json
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+class SharedResolver:
+    mod_jsons: Dict[int, Any]  # id, mod json
+    pages: Dict[Tuple[int, str, int], Any]  # (mod id, files filter, index), compact page of a file listing
+
+    def __init__(self):
+        self.mod_jsons = dict()
+        self.pages = dict()
+        self.lock = threading.Lock()
+
+    #########################################################
+    # PAGE FUNCTIONS
+    #########################################################
+
+    def __get_page_key(self, mod_id: int, files_filter: Dict[str, Any], index: int) -> Tuple[int, str, int]:
+        return mod_id, json.dumps(files_filter, sort_keys=True), index
+
+    def get_page(self, mod_id: int, files_filter: Dict[str, Any], index: int) -> Optional[Any]:
+        with self.lock:
+            return self.pages.get(self.__get_page_key(mod_id, files_filter, index))
+
+    def put_page(self, mod_id: int, files_filter: Dict[str, Any], index: int, page: Any):
+        with self.lock:
+            self.pages[self.__get_page_key(mod_id, files_filter, index)] = page
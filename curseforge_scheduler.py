@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, List, Tuple
+
+import curseforge_metrics
+import logger
+from curseforge_http import TokenBucket
+
+# Seconds between two progress reports while downloads are running
+REPORT_INTERVAL = 5.0
+
+
+def get_stats() -> Dict[str, float]:
+    # Throughput over every download phase of the run, several mods lists may have run in one process
+    elapsed = curseforge_metrics.get_phase('downloads')
+    downloaded = curseforge_metrics.counters.get(('downloaded_bytes', ''), 0)
+    return {'download_bytes_per_second': downloaded / elapsed if elapsed > 0 else 0.0}
+
+
+curseforge_metrics.register_collector(get_stats)
+
+
+class DownloadScheduler:
+    workers: int
+    bandwidth_limit: int  # bytes per second, 0 for no limit
+    bytes_total: int
+    bytes_done: int
+    started: float
+    finished: float
+
+    def __init__(self, workers: int, bandwidth_limit: int = 0):
+        self.workers = max(1, workers)
+        self.bandwidth_limit = max(0, bandwidth_limit)
+        # One second of bandwidth may be used at once, any larger chunk waits for the tokens it is short of
+        self.bandwidth = TokenBucket(self.bandwidth_limit, self.bandwidth_limit)
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.started = 0.0
+        self.finished = 0.0
+        self.reported = 0.0
+        self.lock = threading.Lock()
+
+    #########################################################
+    # SCHEDULING FUNCTIONS
+    #########################################################
+
+    def run(self, tasks: List[Tuple[Any, int]], function: Callable[[Any], Any]) -> List[Tuple[Any, Future]]:
+        # The largest files start first so that no large file is left running alone at the end
+        ordered = sorted(tasks, key=lambda task: task[1], reverse=True)
+        self.bytes_total = sum(size for _, size in tasks)
+        self.bytes_done = 0
+        self.started = self.reported = time.monotonic()
+        logger.log_info('Downloading %s files, %s KiB in total, %s at a time%s' %
+                        (len(tasks), self.bytes_total // 1024, self.workers,
+                         ', limited to %s KiB/s' % (self.bandwidth_limit // 1024) if self.bandwidth_limit else ''))
+        with curseforge_metrics.phase('downloads'), ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [(item, executor.submit(function, item)) for item, _ in ordered]
+        self.finished = time.monotonic()
+        curseforge_metrics.count('download_tasks', amount=len(tasks))
+        curseforge_metrics.count('downloaded_bytes', amount=self.bytes_done)
+        logger.log_info('Downloaded %s KiB in %.1f seconds (%s KiB/s)' %
+                        (self.bytes_done // 1024, self.get_elapsed(), self.get_throughput() // 1024))
+        return futures
+
+    def transferred(self, num_bytes: int):
+        self.bandwidth.acquire(num_bytes)
+        with self.lock:
+            self.bytes_done += num_bytes
+            now = time.monotonic()
+            if now - self.reported < REPORT_INTERVAL:
+                return
+            self.reported = now
+        self.__report()
+
+    def skipped(self, num_bytes: int):
+        # Bytes of a failed download will not arrive, so they no longer count towards the ETA
+        with self.lock:
+            self.bytes_total -= num_bytes
+
+    #########################################################
+    # PROGRESS FUNCTIONS
+    #########################################################
+
+    def get_elapsed(self) -> float:
+        end = self.finished if self.finished >= self.started else time.monotonic()
+        return end - self.started
+
+    def get_throughput(self) -> int:
+        elapsed = self.get_elapsed()
+        return int(self.bytes_done / elapsed) if elapsed > 0 else 0
+
+    def get_eta(self) -> float:
+        throughput = self.get_throughput()
+        if throughput == 0:
+            return 0.0
+        return max(0, self.bytes_total - self.bytes_done) / throughput
+
+    def __report(self):
+        eta = int(self.get_eta())
+        logger.log_info('Downloaded %s of %s KiB at %s KiB/s, %s minutes, %s seconds remaining' %
+                        (self.bytes_done // 1024, self.bytes_total // 1024, self.get_throughput() // 1024,
+                         eta // 60, eta % 60))
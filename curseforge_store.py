@@ -0,0 +1,178 @@
+import os
+import shutil
+import time
+from typing import List, Optional, Tuple
+
+import logger
+import curseforge_cache
+
+# Optional dependency: fcntl only exists on Unix, where it is used to reflink files on filesystems that support it
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request of Linux that shares the blocks of one file with another (copy on write)
+FICLONE = 0x40049409
+
+# Blobs that were written this recently are never collected, another run may be about to link them
+GC_GRACE_PERIOD = 60 * 60
+# Partial downloads are kept much longer, the next run resumes them
+PARTIAL_GRACE_PERIOD = 7 * 24 * 60 * 60
+
+# The cache databases that link files from the store, one path per line. The references to blobs are kept in
+# each cache, so blobs are only collected while a single cache uses the store.
+CACHES_FILE = 'caches.txt'
+
+
+class JarStore:
+    folder_path: str
+    partial_suffix: str  # of the files that are still being downloaded
+    registered: bool  # the cache is listed in the store, done by the first write so a CHECK never touches the disk
+
+    def __init__(self, folder_path: str, partial_suffix: str = '.part'):
+        self.folder_path = folder_path
+        self.partial_suffix = partial_suffix
+        self.registered = False
+
+    #########################################################
+    # CACHE FUNCTIONS
+    #########################################################
+
+    def __get_cache_path(self) -> str:
+        return os.path.abspath(curseforge_cache.db_name)
+
+    def __read_caches(self) -> List[str]:
+        caches_path = os.path.join(self.folder_path, CACHES_FILE)
+        if not os.path.isfile(caches_path):
+            return []
+        with open(caches_path, 'r') as file:
+            return [line.strip() for line in file if len(line.strip()) != 0]
+
+    def __register_cache(self):
+        if self.registered:
+            return
+        self.registered = True
+        os.makedirs(self.folder_path, exist_ok=True)
+        cache_path = self.__get_cache_path()
+        if cache_path in self.__read_caches():
+            return
+        with open(os.path.join(self.folder_path, CACHES_FILE), 'a') as file:
+            file.write(cache_path + '\n')
+
+    def __get_other_caches(self) -> List[str]:
+        # A cache that was deleted no longer links anything
+        cache_path = self.__get_cache_path()
+        return [path for path in self.__read_caches() if path != cache_path and os.path.isfile(path)]
+
+    #########################################################
+    # BLOB FUNCTIONS
+    #########################################################
+
+    def get_blob(self, file_id: int, file_hash: Optional[str]) -> str:
+        # Blobs are keyed by file ID and hash and spread over subfolders, so no folder grows too large
+        key = '%s-%s' % (file_id, file_hash if file_hash is not None else 'unknown')
+        return '%s/%s' % (str(file_id)[-2:], key)
+
+    def get_blob_path(self, blob: str) -> str:
+        return os.path.join(self.folder_path, *blob.split('/'))
+
+    def contains(self, blob: str, file_length: Optional[int]) -> bool:
+        blob_path = self.get_blob_path(blob)
+        if not os.path.isfile(blob_path):
+            return False
+        return file_length is None or os.path.getsize(blob_path) == file_length
+
+    def prepare(self, blob: str) -> str:
+        self.__register_cache()
+        blob_path = self.get_blob_path(blob)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        return blob_path
+
+    #########################################################
+    # LINK FUNCTIONS
+    #########################################################
+
+    def __reflink(self, source_path: str, target_path: str):
+        if fcntl is None:
+            raise OSError('Reflinks are not supported on this platform')
+        with open(source_path, 'rb') as source, open(target_path, 'wb') as target:
+            try:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            except OSError:
+                target.close()
+                os.remove(target_path)
+                raise
+
+    def link(self, blob: str, file_path: str, temp_path: str) -> str:
+        # A hardlink costs no space at all, a reflink only shares blocks and a copy is the last resort.
+        # The link is made next to the file and renamed over it, so the file is never seen half written.
+        self.__register_cache()
+        blob_path = self.get_blob_path(blob)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        try:
+            os.link(blob_path, temp_path)
+            method = 'hardlink'
+        except OSError:
+            try:
+                self.__reflink(blob_path, temp_path)
+                method = 'reflink'
+            except OSError:
+                shutil.copyfile(blob_path, temp_path)
+                method = 'copy'
+        os.replace(temp_path, file_path)
+        return method
+
+    def add_ref(self, blob: str, output_path: str, file_name: str):
+        curseforge_cache.add_store_ref(blob, output_path, file_name)
+
+    def remove_ref(self, output_path: str, file_name: str):
+        curseforge_cache.remove_store_refs([(output_path, file_name)])
+
+    #########################################################
+    # COLLECTION FUNCTIONS
+    #########################################################
+
+    def collect_garbage(self) -> Tuple[int, int]:
+        if not os.path.isdir(self.folder_path):
+            return 0, 0
+        self.__register_cache()
+        # References of any output folder count, the files of a reference that was deleted by hand do not
+        live_blobs = set()
+        stale_refs = []
+        for blob, output_path, file_name in curseforge_cache.get_store_refs():
+            if os.path.isfile(os.path.join(output_path, file_name)):
+                live_blobs.add(blob)
+            else:
+                stale_refs.append((output_path, file_name))
+        curseforge_cache.remove_store_refs(stale_refs)
+
+        # This cache does not know the references of the others, their blobs would look unused
+        other_caches = self.__get_other_caches()
+        if len(other_caches) != 0:
+            logger.log_info('(Store) Not removing unreferenced files, the store is also used by: %s' %
+                            ', '.join(other_caches))
+            return 0, 0
+
+        removed = 0
+        freed = 0
+        cutoff = time.time() - GC_GRACE_PERIOD
+        partial_cutoff = time.time() - PARTIAL_GRACE_PERIOD
+        for shard in os.listdir(self.folder_path):
+            shard_path = os.path.join(self.folder_path, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for key in os.listdir(shard_path):
+                blob_path = os.path.join(shard_path, key)
+                blob_stat = os.stat(blob_path)
+                if '%s/%s' % (shard, key) in live_blobs:
+                    continue
+                if blob_stat.st_mtime > (partial_cutoff if key.endswith(self.partial_suffix) else cutoff):
+                    continue
+                os.remove(blob_path)
+                removed += 1
+                freed += blob_stat.st_size
+        if removed != 0:
+            logger.log_info('(Store) Removed %s unreferenced files, %s KiB freed' % (removed, freed // 1024))
+        return removed, freed
@@ -0,0 +1,93 @@
+import builtins
+import importlib.util
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+import curseforge_metrics
+
+# Import times are measured when the entry point is started with this flag, or with this environment variable set
+FLAG = '--profile-imports'
+ENVIRONMENT_VARIABLE = 'CURSEFORGE_PROFILE_IMPORTS'
+
+# The amount of modules listed in the report, slowest first
+REPORT_SIZE = 25
+
+original_import = builtins.__import__
+started_at: Optional[float] = None
+imports: Dict[str, List[float]] = {}  # module, [seconds including its own imports, seconds of the module alone]
+local = threading.local()  # seconds spent in the imports of each module that is being imported by this thread
+lock = threading.Lock()
+
+
+def __get_module_name(name: str, import_globals: Optional[dict], level: int) -> str:
+    if level == 0 or import_globals is None:
+        return name
+    try:
+        return importlib.util.resolve_name('.' * level + name, import_globals.get('__package__'))
+    except (ImportError, ValueError):
+        return name
+
+
+def __profiled_import(name, import_globals=None, import_locals=None, fromlist=(), level=0):
+    module_name = __get_module_name(name, import_globals, level)
+    # Modules that were imported before only cost a lookup
+    if module_name in sys.modules:
+        return original_import(name, import_globals, import_locals, fromlist, level)
+    stack = getattr(local, 'stack', None)
+    if stack is None:
+        stack = local.stack = []
+    stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return original_import(name, import_globals, import_locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        children = stack.pop()
+        if len(stack) != 0:
+            stack[-1] += elapsed
+        with lock:
+            record = imports.setdefault(module_name, [0.0, 0.0])
+            record[0] += elapsed
+            record[1] += elapsed - children
+
+
+def get_stats() -> Dict[str, float]:
+    return {
+        'imported_modules': len(imports),
+        # Nested imports are part of their parent, only the time of the modules alone adds up
+        'import_seconds': sum(record[1] for record in list(imports.values())),
+    }
+
+
+def start():
+    # Measures every import from here on, including the ones that are deferred until they are needed
+    global started_at
+    enabled = FLAG in sys.argv or len(os.environ.get(ENVIRONMENT_VARIABLE, '')) != 0
+    if FLAG in sys.argv:
+        sys.argv.remove(FLAG)
+    if not enabled or started_at is not None:
+        return
+    started_at = time.perf_counter()
+    builtins.__import__ = __profiled_import
+    curseforge_metrics.register_collector(get_stats)
+
+
+def stop():
+    builtins.__import__ = original_import
+
+
+def print_report():
+    if started_at is None:
+        return
+    stop()
+    stats = get_stats()
+    print('\n---------------------------------')
+    print('Import times:')
+    print('%10s %10s  %s' % ('total ms', 'self ms', 'module'))
+    for module_name, record in sorted(imports.items(), key=lambda item: item[1][0], reverse=True)[:REPORT_SIZE]:
+        print('%10.1f %10.1f  %s' % (record[0] * 1000, record[1] * 1000, module_name))
+    print('%s modules imported in %.1f ms of the %.1f ms since the profile started' %
+          (stats['imported_modules'], stats['import_seconds'] * 1000, (time.perf_counter() - started_at) * 1000))
@@ -1,15 +1,143 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
 from enum import Enum
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 
 class LogLevel(Enum):
+    DEBUG = 'DEBUG'
     INFO = 'INFO'
     WARNING = 'WARN'
     SEVERE = 'ERR'
 
 
-# history: List[Tuple[LogLevel, str]]
-history = []
+SEVERITY = {LogLevel.DEBUG: 0, LogLevel.INFO: 1, LogLevel.WARNING: 2, LogLevel.SEVERE: 3}
+
+# The maximum amount of warnings and errors that are kept for the summary of a run
+ERRORS_SIZE = 1000
+
+# Rotating log files are renamed to .1, .2, ... once they reach this size
+FILE_MAX_BYTES = 10 * 1024 * 1024
+FILE_BACKUPS = 3
+
+
+class ConsoleSink:
+    def write(self, record: Tuple[float, LogLevel, str, str]):
+        print(record[1].value + ': ' + record[2])
+
+    def close(self):
+        pass
+
+
+class RotatingFileSink:
+    def __init__(self, file_path: str, max_bytes: int = FILE_MAX_BYTES, backups: int = FILE_BACKUPS):
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(file_path, 'a', encoding='utf-8')
+
+    def format(self, record: Tuple[float, LogLevel, str, str]) -> str:
+        created, level, text, thread_name = record
+        return '%s [%s] %s: %s\n' % (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created)),
+                                     thread_name, level.value, text)
+
+    def write(self, record: Tuple[float, LogLevel, str, str]):
+        self.file.write(self.format(record))
+        if self.file.tell() >= self.max_bytes:
+            self.__rotate()
+
+    def __rotate(self):
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists('%s.%s' % (self.file_path, index)):
+                os.replace('%s.%s' % (self.file_path, index), '%s.%s' % (self.file_path, index + 1))
+        if self.backups > 0:
+            os.replace(self.file_path, self.file_path + '.1')
+        self.file = open(self.file_path, 'w', encoding='utf-8')
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesSink(RotatingFileSink):
+    def format(self, record: Tuple[float, LogLevel, str, str]) -> str:
+        created, level, text, thread_name = record
+        return json.dumps({'time': created, 'level': level.value, 'thread': thread_name, 'message': text}) + '\n'
+
+
+min_level = LogLevel.INFO
+sinks: list = [ConsoleSink()]
+# Records are written to the sinks by a background thread, so a log call never waits for the console or a file
+records: queue.Queue = queue.Queue()
+writer: Optional[threading.Thread] = None
+# Warnings and errors of the run, the oldest ones are dropped once there are ERRORS_SIZE of them
+errors: deque = deque(maxlen=ERRORS_SIZE)
+dropped_errors = 0
+lock = threading.Lock()
+
+
+#########################################################
+# SINK FUNCTIONS
+#########################################################
+
+def __write_records():
+    while True:
+        record = records.get()
+        if record is None:
+            records.task_done()
+            return
+        for sink in sinks:
+            # A failing sink must not stop the writer, or flush() would wait forever
+            try:
+                sink.write(record)
+            except Exception as e:
+                print('Unable to write log record to %s: %s' % (type(sink).__name__, e))
+        records.task_done()
+
+
+def __start_writer():
+    global writer
+    with lock:
+        if writer is not None:
+            return
+        writer = threading.Thread(target=__write_records, name='logger', daemon=True)
+        writer.start()
+
+
+def configure(level: LogLevel = LogLevel.INFO, log_sinks: list = None):
+    global min_level, sinks
+    flush()
+    min_level = level
+    if log_sinks is not None:
+        for sink in sinks:
+            sink.close()
+        sinks = log_sinks
+
+
+def flush():
+    # Waits until every record that was logged so far has been written
+    if writer is not None:
+        records.join()
+
+
+def close():
+    global writer
+    flush()
+    with lock:
+        if writer is not None:
+            records.put(None)
+            writer.join()
+            writer = None
+    for sink in sinks:
+        sink.close()
+
+
+atexit.register(flush)
 
 
 #########################################################
@@ -17,8 +145,21 @@ history = []
 #########################################################
 
 def log(text: str, level: LogLevel):
-    print(level.value + ': ' + text)
-    history.append((level, text))
+    global dropped_errors
+    if SEVERITY[level] >= SEVERITY[LogLevel.WARNING]:
+        with lock:
+            if len(errors) == ERRORS_SIZE:
+                dropped_errors += 1
+            errors.append((level, text))
+    if SEVERITY[level] < SEVERITY[min_level]:
+        return
+    if writer is None:
+        __start_writer()
+    records.put((time.time(), level, text, threading.current_thread().name))
+
+
+def log_debug(text: str):
+    log(text, LogLevel.DEBUG)
 
 
 def log_info(text: str):
@@ -31,3 +172,15 @@ def log_warning(text: str):
 
 def log_severe(text: str):
     log(text, LogLevel.SEVERE)
+
+
+def get_errors() -> List[Tuple[LogLevel, str]]:
+    with lock:
+        return list(errors)
+
+
+def reset_errors():
+    global dropped_errors
+    with lock:
+        errors.clear()
+        dropped_errors = 0
@@ -1,24 +1,120 @@
-import os
-from os import path
-from dotenv import load_dotenv
+import import_profiler
+# Started before anything else is imported, with --profile-imports or CURSEFORGE_PROFILE_IMPORTS
+import_profiler.start()
+
 from curseforge_downloader import CurseForgeDownloader
 import curseforge_cache
+import curseforge_http
+import curseforge_metrics
 from curseforge_api_schemas import FileReleaseType
+import logger
 
 # Change these values here:
 # The path to the input mods list (Text file or similar)
 MODS_FILE = 'run\\mods.txt'
 # The output folder location. Where all files will be downloaded to.
 OUTPUT_FOLDER = 'run\\output'
+# A folder that keeps one copy of every jar, shared by all output folders that use it. Jars are hardlinked
+# (or reflinked, or copied) from it into the output folder. None downloads into the output folder directly.
+STORE_FOLDER = None
+# A JSON file of the games, categories and mods that were looked up, loaded before and saved after the run, so a
+# machine without cache.db starts without lookup queries. None only uses the cache.
+SNAPSHOT_FILE = None
 # The list of versions that should be considered when downloading
 VERSIONS = ['1.16', '1.16.1', '1.16.2', '1.16.3', '1.16.4', '1.16.5']
 # The list of versions that should be excluded when downloading
 EXCLUDED = ['Fabric']
 # The list of release types that should be considered when downloading
 RELEASE_TYPES = [FileReleaseType.RELEASE, FileReleaseType.BETA, FileReleaseType.ALPHA]
+# The number of mods that are processed at the same time. 1 processes mods one after another.
+WORKERS = 8
+# Seconds to wait for a connection to open and for a response to arrive
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+# The maximum amount of API requests per second across all workers. 0 disables the limit.
+REQUESTS_PER_SECOND = 20
+# The maximum amount of attempts of a failed API request or download
+MAX_RETRIES = 5
+# The number of mods that are resolved in a single bulk API request
+BULK_SIZE = 50
+# Only query the files of the versions above instead of filtering every file of a mod locally
+SERVER_SIDE_FILTER = True
+# Seconds that a cached file listing is used before it is revalidated against the mod
+LISTING_TTL = 24 * 60 * 60
+# Plan only from cached data without any network calls. Nothing is downloaded.
+OFFLINE = False
+# Identify the jars in the output folder by their CurseForge fingerprint instead of by their name
+FINGERPRINTS = True
+# The amount of bytes that a download reads and writes at once
+BUFFER_SIZE = 1024 * 1024
+# The maximum amount of files that are downloaded at once. 0 uses the number of workers.
+MAX_DOWNLOADS = 0
+# The maximum download speed in bytes per second across all downloads. 0 disables the limit.
+BANDWIDTH_LIMIT = 0
+# Ask for the ID of a mod in the console when no search finds it. Otherwise, and when there is no console,
+# every unresolved mod is listed at the end of the run.
+REQUEST_MISSING_IDS = True
+# The maximum amount of searches for a mod that is not cached, and the amount of mods in each of them (1-50)
+MAX_SEARCHES = 10
+SEARCH_SIZE = 50
+# Seconds before a mod that no search found is searched again
+UNRESOLVED_TTL = 7 * 24 * 60 * 60
+# The lowest level of log records that are written (DEBUG, INFO, WARNING or SEVERE)
+LOG_LEVEL = logger.LogLevel.INFO
+# A rotating log file and a rotating JSON lines log file next to the console. None disables them.
+LOG_FILE = None
+LOG_JSON_FILE = None
+# DOWNLOAD downloads every mod, UPDATE updates the mods in the output folder and downloads missing ones, CHECK only
+# prints the planned changes without downloading anything
+EXECUTION_TYPE = 'DOWNLOAD'
+# Where check_for_updates saves its plan as JSON. None only prints the plan.
+PLAN_FILE = None
+# Where the phase times, request latencies, cache hit ratio and throughput of the run are saved, as a JSON report
+# and in the Prometheus text format. None disables them.
+REPORT_FILE = None
+PROMETHEUS_FILE = None
 
 if __name__ == '__main__':
+    log_sinks = [logger.ConsoleSink()]
+    if LOG_FILE is not None:
+        log_sinks.append(logger.RotatingFileSink(LOG_FILE))
+    if LOG_JSON_FILE is not None:
+        log_sinks.append(logger.JsonLinesSink(LOG_JSON_FILE))
+    logger.configure(LOG_LEVEL, log_sinks)
     curseforge_cache.connect()
-    downloader = CurseForgeDownloader(MODS_FILE, OUTPUT_FOLDER, VERSIONS, EXCLUDED, RELEASE_TYPES)
-    downloader.download_all()
+    if SNAPSHOT_FILE is not None:
+        curseforge_cache.load_snapshot(SNAPSHOT_FILE)
+    curseforge_http.connect(curseforge_http.get_pool_size(WORKERS, MAX_DOWNLOADS), CONNECT_TIMEOUT, READ_TIMEOUT,
+                            REQUESTS_PER_SECOND)
+    downloader = CurseForgeDownloader(MODS_FILE, OUTPUT_FOLDER, VERSIONS, EXCLUDED, RELEASE_TYPES,
+                                      workers=WORKERS,
+                                      bulk_size=BULK_SIZE,
+                                      server_side_filter=SERVER_SIDE_FILTER,
+                                      listing_ttl=LISTING_TTL,
+                                      offline=OFFLINE,
+                                      fingerprints=FINGERPRINTS,
+                                      buffer_size=BUFFER_SIZE,
+                                      max_retries=MAX_RETRIES,
+                                      max_downloads=MAX_DOWNLOADS,
+                                      bandwidth_limit=BANDWIDTH_LIMIT,
+                                      store_path=STORE_FOLDER,
+                                      request_missing_ids=REQUEST_MISSING_IDS,
+                                      max_searches=MAX_SEARCHES,
+                                      search_size=SEARCH_SIZE,
+                                      unresolved_ttl=UNRESOLVED_TTL)
+    if EXECUTION_TYPE == 'CHECK':
+        downloader.check_for_updates(PLAN_FILE)
+    elif EXECUTION_TYPE == 'UPDATE':
+        downloader.update_all()
+    else:
+        downloader.download_all()
+    if REPORT_FILE is not None:
+        curseforge_metrics.save_report(REPORT_FILE)
+    if PROMETHEUS_FILE is not None:
+        curseforge_metrics.save_prometheus(PROMETHEUS_FILE)
+    if SNAPSHOT_FILE is not None:
+        curseforge_cache.save_snapshot(SNAPSHOT_FILE)
+    curseforge_http.close()
     curseforge_cache.close()
+    logger.close()
+    import_profiler.print_report()